@@ -0,0 +1,218 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from assignment import config
+from assignment.config import (
+    BACKTESTS_DIR,
+    location_columns,
+    targets,
+)
+from assignment.feature_store import load_processed_data
+from assignment.features import _add_days_since_features, days_since_thresholds
+from assignment.instrumentation import (
+    enable_profiling,
+    stage,
+    start_run,
+    write_run_report,
+)
+from assignment.pools import memory_pools
+from assignment.predict import _predict_for_dataset
+from assignment.train import _fit_model, preprocess_df
+
+# Scored columns: the daily targets the models predict and the cumulative
+# counts rebuilt from them, each against its actual value
+scored_columns = {
+    "LogNewConfirmedCases": "PredictedLogNewConfirmedCases",
+    "LogNewFatalities": "PredictedLogNewFatalities",
+    "ConfirmedCases": "PredictedConfirmedCases",
+    "Fatalities": "PredictedFatalities",
+}
+
+
+def run(args):
+    start_run()
+    enable_profiling(args.profile_stage, args.profile_mode)
+
+    processed_df = load_processed_data(jobs=args.jobs)
+    folds = make_folds(
+        processed_df,
+        n_folds=args.folds,
+        horizon=args.horizon,
+        step=args.step,
+        eval_days=args.eval_days,
+    )
+    with stage("backtest"):
+        scores_df = run_backtest(
+            processed_df, folds, iterations=args.iterations, workers=args.jobs
+        )
+    _save_scores(scores_df)
+    write_run_report(BACKTESTS_DIR, "backtest")
+    return scores_df
+
+
+def default_eval_days() -> int:
+    # Days of the eval split before each cutoff, as between the config split dates
+    return (config.LAST_EVAL_DATE - config.LAST_TRAIN_DATE).days
+
+
+def make_folds(
+    processed_df: pd.DataFrame,
+    n_folds: int = 5,
+    horizon: int = 14,
+    step: int = 7,
+    eval_days: int = None,
+):
+    # (last train date, cutoff, last forecast date) per fold: models are
+    # trained up to the train date with early stopping on the days
+    # up to the cutoff, then forecast the `horizon` days after it. The last
+    # fold ends on the last date with actual counts.
+    if eval_days is None:
+        eval_days = default_eval_days()
+    actual_dates = processed_df.loc[processed_df["ConfirmedCases"].notna(), "Date"]
+    last_date = actual_dates.max()
+    folds = []
+    for fold_idx in reversed(range(n_folds)):
+        cutoff = last_date - pd.Timedelta(days=horizon + fold_idx * step)
+        last_train_date = cutoff - pd.Timedelta(days=eval_days)
+        if last_train_date < actual_dates.min():
+            raise ValueError(
+                f"Fold with cutoff {cutoff.date()} has no training days, "
+                "use fewer folds or a shorter step"
+            )
+        folds.append((last_train_date, cutoff, cutoff + pd.Timedelta(days=horizon)))
+    return folds
+
+
+def run_backtest(processed_df, folds, iterations: int = 300, workers: int = 1):
+    # The processed frame is built once and shared by every fold: each worker
+    # receives it once, the folds only slice it
+    cpu_count = os.cpu_count() or 1
+    workers = min(workers or cpu_count, len(folds))
+    if workers <= 1:
+        results = [_run_fold(fold, iterations, processed_df) for fold in folds]
+    else:
+        thread_count = max(1, cpu_count // workers)
+        print(f"Running {len(folds)} folds in {workers} processes")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_backtest_worker,
+            initargs=(processed_df,),
+        ) as executor:
+            results = list(
+                executor.map(
+                    _run_fold,
+                    folds,
+                    [iterations] * len(folds),
+                    [None] * len(folds),
+                    [thread_count] * len(folds),
+                )
+            )
+
+    scores_df = pd.concat(results, ignore_index=True)
+    _print_scores(scores_df)
+    return scores_df
+
+
+_processed_df = None
+
+
+def _init_backtest_worker(processed_df):
+    global _processed_df
+    _processed_df = processed_df
+
+
+def _run_fold(fold, iterations: int, processed_df=None, thread_count: int = None):
+    last_train_date, cutoff, last_date = fold
+    if processed_df is None:
+        processed_df = _processed_df
+    fold_df = _as_of(processed_df.loc[processed_df["Date"] <= last_date], cutoff)
+
+    train_df = fold_df.loc[fold_df["Date"] <= last_train_date]
+    eval_df = fold_df.loc[
+        (fold_df["Date"] > last_train_date) & (fold_df["Date"] <= cutoff)
+    ]
+    test_df = fold_df.loc[fold_df["Date"] > cutoff].copy()
+    training_data = (*preprocess_df(train_df), *preprocess_df(eval_df))
+
+    params = {"iterations": iterations, "allow_writing_files": False}
+    if thread_count:
+        params["thread_count"] = thread_count
+    pools = memory_pools(training_data)
+    models = {
+        target: _fit_model((target, target, params), pools, io.StringIO())[2]
+        for target in targets
+    }
+
+    # Recursive forecast: predictions replace the lags after the cutoff
+    test_features_df, _ = preprocess_df(test_df)
+    _predict_for_dataset(
+        test_df,
+        test_features_df,
+        eval_df.loc[eval_df["Date"] == cutoff],
+        cutoff + pd.Timedelta(days=1),
+        last_date,
+        update_features_data=True,
+        models=models,
+    )
+    print(f"Fold with cutoff {cutoff.date()} done")
+    return _score_fold(test_df, cutoff)
+
+
+def _as_of(fold_df: pd.DataFrame, cutoff) -> pd.DataFrame:
+    # Days-since features are computed from the whole series, recompute them
+    # from the counts known at the cutoff like for the Kaggle test rows
+    known_df = fold_df[location_columns + ["Day", "ConfirmedCases", "Fatalities"]]
+    known_df = known_df.mask(
+        (fold_df["Date"] > cutoff).to_numpy()[:, np.newaxis]
+        & known_df.columns.isin(["ConfirmedCases", "Fatalities"])
+    )
+    known_df = _add_days_since_features(known_df, days_since_thresholds)
+
+    fold_df = fold_df.copy()
+    days_since_columns = [c for c in known_df.columns if c.startswith("Days_since_")]
+    fold_df[days_since_columns] = known_df[days_since_columns]
+    return fold_df
+
+
+def _score_fold(test_df: pd.DataFrame, cutoff) -> pd.DataFrame:
+    # RMSLE per scored column and horizon; the log targets are already log1p
+    horizon = (test_df["Date"] - cutoff).dt.days.to_numpy()
+    scores = []
+    for column, predicted_column in scored_columns.items():
+        actual = test_df[column].to_numpy(dtype="float64")
+        predicted = test_df[predicted_column].to_numpy(dtype="float64")
+        if not column.startswith("LogNew"):
+            actual, predicted = np.log1p(actual), np.log1p(predicted)
+        squared_errors = pd.Series((predicted - actual) ** 2).groupby(horizon)
+        for day, errors in squared_errors:
+            scores.append(
+                {
+                    "cutoff": str(cutoff.date()),
+                    "target": column,
+                    "horizon": day,
+                    "rmsle": float(np.sqrt(errors.mean())),
+                    "rows": len(errors),
+                }
+            )
+    return pd.DataFrame(scores)
+
+
+def _print_scores(scores_df: pd.DataFrame):
+    # Mean RMSLE over the folds, one row per horizon
+    summary_df = scores_df.pivot_table(
+        index="horizon", columns="target", values="rmsle", aggfunc="mean"
+    )
+    print(f"Backtest RMSLE per horizon, mean of {scores_df['cutoff'].nunique()} folds:")
+    print(summary_df[list(scored_columns)].round(4).to_string())
+
+
+def _save_scores(scores_df: pd.DataFrame):
+    os.makedirs(BACKTESTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(BACKTESTS_DIR, f"backtest_{stamp}.csv")
+    scores_df.to_csv(path, index=False)
+    print(f"Backtest scores saved to {path}")
@@ -0,0 +1,260 @@
+import argparse
+import datetime
+import os
+
+# Only light modules are imported here: pandas, catboost, geopy and matplotlib
+# come in with the command modules, which are imported once the arguments are
+# parsed, so `--help` and the "models already exist" path never load them
+from assignment import config
+from assignment.instrumentation import add_instrumentation_arguments
+
+# Argument -> config attribute it overrides
+path_overrides = {
+    "train_csv": "COVID19_TRAIN_DATASET_PATH",
+    "test_csv": "COVID19_TEST_DATASET_PATH",
+    "models_dir": "MODELS_DIR",
+    "predictions_dir": "PREDICTIONS_DIR",
+    "feature_store_dir": "FEATURE_STORE_DIR",
+}
+date_overrides = {
+    "last_train_date": "LAST_TRAIN_DATE",
+    "last_eval_date": "LAST_EVAL_DATE",
+    "last_test_date": "LAST_TEST_DATE",
+}
+
+
+def train(argv=None):
+    parser = argparse.ArgumentParser(description="Train the COVID-19 models.")
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="continue boosting the latest models on dates added since they were trained",
+    )
+    parser.add_argument("--warm-start-iterations", type=int, default=100)
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="build the features chunk by chunk on disk and train from CatBoost pool files",
+    )
+    parser.add_argument(
+        "--chunk-locations",
+        type=int,
+        default=config.STREAMING_CHUNK_LOCATIONS,
+        help="locations per chunk in --streaming mode",
+    )
+    parser.add_argument(
+        "--train-workers",
+        type=int,
+        default=None,
+        help="processes training the per-target models, default one per target up to the number of cores",
+    )
+    add_jobs_argument(parser)
+    add_compact_arguments(parser)
+    add_split_date_arguments(parser)
+    add_path_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.streaming and args.warm_start:
+        parser.error("--warm-start is not supported with --streaming")
+    if args.train_workers is not None and args.train_workers < 1:
+        parser.error("--train-workers must be at least 1")
+    apply_overrides(args)
+
+    from assignment.registry import latest_model_paths
+
+    if not args.warm_start and latest_model_paths(config.targets):
+        print("Using existing models, skipping training.")
+        return
+
+    from assignment.train import run
+
+    run(args)
+
+
+def predict(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast with the latest models.")
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        help="also export the predictions as CSV next to the Parquet file",
+    )
+    add_jobs_argument(parser)
+    add_compact_arguments(parser)
+    add_split_date_arguments(parser)
+    add_path_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_overrides(args)
+
+    from assignment.registry import latest_model_paths
+
+    if not latest_model_paths(config.targets):
+        raise RuntimeError(
+            "No trained models found. Please run `poetry run train` first."
+        )
+
+    from assignment.predict import run
+
+    run(args)
+
+
+def plot(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Plot the latest predictions against the actual values."
+    )
+    parser.add_argument(
+        "--location",
+        nargs="+",
+        action="append",
+        metavar=("COUNTRY", "PROVINCE"),
+        help="location to plot, e.g. --location US Kansas (repeatable)",
+    )
+    parser.add_argument("--linear", action="store_true", help="linear y axis")
+    add_split_date_arguments(parser, test=False)
+    parser.add_argument("--predictions-dir")
+    args = parser.parse_args(argv)
+    if any(len(location) > 2 for location in args.location or []):
+        parser.error("--location takes a country and an optional province")
+    apply_overrides(args)
+
+    from assignment.plots import run
+
+    run(args)
+
+
+def backtest(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Score rolling-origin forecasts of models retrained at each cutoff."
+    )
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument(
+        "--horizon", type=int, default=14, help="days forecast after each cutoff"
+    )
+    parser.add_argument(
+        "--step", type=int, default=7, help="days between consecutive cutoffs"
+    )
+    parser.add_argument(
+        "--eval-days",
+        type=int,
+        default=None,
+        help="days before each cutoff used for early stopping, default as between the split dates",
+    )
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="processes used to build the features and to run the folds",
+    )
+    add_input_path_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.eval_days is not None and args.eval_days < 1:
+        parser.error("--eval-days must be at least 1")
+    apply_overrides(args)
+
+    from assignment.backtest import run
+
+    run(args)
+
+
+def tune(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Search CatBoost parameters and lag windows with successive halving."
+    )
+    parser.add_argument("--trials", type=int, default=27, help="configs sampled")
+    parser.add_argument(
+        "--eta",
+        type=int,
+        default=3,
+        help="each rung keeps 1/eta of the configs with eta times more iterations",
+    )
+    parser.add_argument("--min-iterations", type=int, default=100)
+    parser.add_argument("--max-iterations", type=int, default=1000)
+    parser.add_argument("--early-stopping-rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--targets", nargs="+", choices=config.targets)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="processes used to build the features and to run the trials",
+    )
+    add_split_date_arguments(parser)
+    add_input_path_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.eta < 2:
+        parser.error("--eta must be at least 2")
+    apply_overrides(args)
+
+    from assignment.tuning import run
+
+    run(args)
+
+
+def add_jobs_argument(parser):
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="processes used to build the features"
+    )
+
+
+def add_compact_arguments(parser):
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="keep features as float32/int16 with categorical locations and split without copying",
+    )
+    parser.add_argument(
+        "--memory-profile",
+        action="store_true",
+        help="print the memory used by the processed features and the peak memory of the process",
+    )
+
+
+def add_split_date_arguments(parser, test: bool = True):
+    names = ["last_train_date", "last_eval_date"] + (["last_test_date"] if test else [])
+    for name in names:
+        parser.add_argument(
+            "--" + name.replace("_", "-"),
+            type=_iso_date,
+            metavar="YYYY-MM-DD",
+            help=f"default {config.split_dates[date_overrides[name]]}",
+        )
+
+
+def add_path_arguments(parser):
+    add_input_path_arguments(parser)
+    parser.add_argument("--models-dir")
+    parser.add_argument("--predictions-dir")
+
+
+def add_input_path_arguments(parser):
+    parser.add_argument("--train-csv", help="Kaggle week-1 train.csv")
+    parser.add_argument("--test-csv", help="Kaggle week-1 test.csv")
+    parser.add_argument("--feature-store-dir")
+
+
+def apply_overrides(args):
+    # Modules read the paths and split dates from `config` when they use them,
+    # so overrides apply whether or not they are already imported
+    overrides = {
+        name: os.path.abspath(getattr(args, dest))
+        for dest, name in path_overrides.items()
+        if getattr(args, dest, None)
+    }
+    dates = {
+        name: getattr(args, dest)
+        for dest, name in date_overrides.items()
+        if getattr(args, dest, None)
+    }
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    config.split_dates.update(dates)
+
+
+def _iso_date(value: str) -> str:
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}, use YYYY-MM-DD")
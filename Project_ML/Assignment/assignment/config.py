@@ -1,17 +1,21 @@
 import os
-import pandas as pd
 
 # Base directories
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATASETS_DIR = os.path.join(BASE_DIR, "datasets")
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 PREDICTIONS_DIR = os.path.join(BASE_DIR, "predictions")
+FEATURE_STORE_DIR = os.path.join(BASE_DIR, "feature_store")
+PROFILES_DIR = os.path.join(BASE_DIR, "profiles")
+BACKTESTS_DIR = os.path.join(BASE_DIR, "backtests")
+TUNING_DIR = os.path.join(BASE_DIR, "tuning")
 # Dataset folders
 AREA_DIR = os.path.join(DATASETS_DIR, "area")
 SMOKING_DIR = os.path.join(DATASETS_DIR, "smoking")
 HOSPITAL_BEDS_DIR = os.path.join(DATASETS_DIR, "hospital_beds")
 HEALTH_EXPENDITURE_DIR = os.path.join(DATASETS_DIR, "health_expenditure")
 POPULATION_DIR = os.path.join(DATASETS_DIR, "population")
+DOWNLOADS_MANIFEST_PATH = os.path.join(DATASETS_DIR, "downloads.json")
 
 # CSV paths
 AREA_DATASET_PATH = os.path.join(AREA_DIR, "API_AG.LND.TOTL.K2_DS2_en_csv_v2_21556.csv")
@@ -40,8 +44,54 @@ COVID19_TEST_DATASET_PATH = os.path.join(
 cat_features = ["Province/State", "Country/Region"]
 targets = ["LogNewConfirmedCases", "LogNewFatalities"]
 location_columns = ["Country/Region", "Province/State"]
+# Columns of the predictions artifact written by `predict`
+prediction_columns = [
+    "Id",
+    "ForecastId",
+    "Province/State",
+    "Country/Region",
+    "Date",
+    "ConfirmedCases",
+    "Fatalities",
+    "LogNewConfirmedCases",
+    "LogNewFatalities",
+    "PredictedLogNewConfirmedCases",
+    "PredictedLogNewFatalities",
+    "PredictedConfirmedCases",
+    "PredictedFatalities",
+]
+DAYS_HISTORY_SIZE = 30
+# Locations processed at once by the streaming feature pipeline
+STREAMING_CHUNK_LOCATIONS = 500
 
-# Split dates
-LAST_TRAIN_DATE = pd.Timestamp(2020, 3, 11)
-LAST_EVAL_DATE = pd.Timestamp(2020, 3, 24)
-LAST_TEST_DATE = pd.Timestamp(2020, 4, 23)
+# Distance features: Distance_to_<name> for each origin, given either as
+# (Country/Region, Province/State) present in the data or as (Lat, Long)
+distance_origins = {"origin": ("China", "Hubei")}
+DISTANCE_METHOD = "vincenty"
+
+# UN WPP years aggregated into the country population features
+POPULATION_YEARS = (2014, 2019)
+
+# Compact mode: columns kept in float64 so that cumulative counts stay exact
+compact_float64_columns = ["Id", "ForecastId", "ConfirmedCases", "Fatalities"]
+compact_int16_columns = ["Day", "WeekDay"]
+
+# Stages to profile (comma separated) and the profiler, "cprofile" or "tracemalloc"
+PROFILE_STAGES_ENV_VAR = "ASSIGNMENT_PROFILE_STAGES"
+PROFILE_MODE_ENV_VAR = "ASSIGNMENT_PROFILE_MODE"
+
+# Split dates, read as pd.Timestamp through `__getattr__` below so that
+# importing the config (and the CLI help) does not import pandas
+split_dates = {
+    "LAST_TRAIN_DATE": "2020-03-11",
+    "LAST_EVAL_DATE": "2020-03-24",
+    "LAST_TEST_DATE": "2020-04-23",
+}
+
+
+def __getattr__(name):
+    if name in split_dates:
+        import pandas as pd
+
+        return pd.Timestamp(split_dates[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,14 +1,8 @@
-import os
 import pandas as pd
-import urllib.request
-import zipfile
-import requests
-import io
 
+from assignment import config
 from assignment.config import (
     AREA_DIR,
-    COVID19_TEST_DATASET_PATH,
-    COVID19_TRAIN_DATASET_PATH,
     SMOKING_DIR,
     HOSPITAL_BEDS_DIR,
     HEALTH_EXPENDITURE_DIR,
@@ -19,14 +13,30 @@ from assignment.config import (
     HEALTH_EXPENDITURE_DATASET_PATH,
     POPULATION_DATASET_PATH,
 )
+from assignment.downloader import download_datasets
+from assignment.instrumentation import instrumented
+from assignment.utils import (
+    is_pyarrow_available,
+    remap_country_names,
+    world_bank_country_names,
+    un_wpp_country_names,
+)
 
 
+@instrumented("load_data")
 def load_data() -> pd.DataFrame:
     _download_additional_datasets()
 
-    original_train_df = pd.read_csv(COVID19_TRAIN_DATASET_PATH, parse_dates=["Date"])
-    original_test_df = pd.read_csv(COVID19_TEST_DATASET_PATH, parse_dates=["Date"])
+    original_train_df = pd.read_csv(
+        config.COVID19_TRAIN_DATASET_PATH, parse_dates=["Date"]
+    )
+    original_test_df = pd.read_csv(
+        config.COVID19_TEST_DATASET_PATH, parse_dates=["Date"]
+    )
+    return combine_train_and_test(original_train_df, original_test_df)
+
 
+def combine_train_and_test(original_train_df, original_test_df) -> pd.DataFrame:
     last_original_train_date = original_train_df["Date"].max()
 
     original_test_wo_train_df = original_test_df.drop(
@@ -38,94 +48,179 @@ def load_data() -> pd.DataFrame:
     main_df = pd.concat(
         [original_train_df, original_test_wo_train_df], ignore_index=True
     )
+    return fix_cruise_ship_locations(main_df)
 
-    from_cruise_ships = main_df["Province/State"].isin(
+
+def fix_cruise_ship_locations(df: pd.DataFrame) -> pd.DataFrame:
+    from_cruise_ships = df["Province/State"].isin(
         ["From Diamond Princess", "Grand Princess"]
     )
-    main_df.loc[from_cruise_ships, ["Province/State", "Country/Region"]] = main_df.loc[
+    df.loc[from_cruise_ships, ["Province/State", "Country/Region"]] = df.loc[
         from_cruise_ships, ["Country/Region", "Province/State"]
     ].values
 
-    return main_df
+    return df
 
 
-def load_area_df(converters):
-    return pd.read_csv(AREA_DATASET_PATH, skiprows=4, converters=converters)
+def _world_bank_schema(first_year: int, last_year: int) -> dict:
+    years = [str(year) for year in range(first_year, last_year + 1)]
+    return {"Country Name": "category", **{year: "float32" for year in years}}
 
 
-def load_population_df(converters):
-    return pd.read_csv(
-        POPULATION_DATASET_PATH,
-        usecols=["Location", "Time", "AgeGrp", "PopMale", "PopFemale", "PopTotal"],
-        parse_dates=["Time"],
-        converters=converters,
+# Years read from each World Bank dataset
+world_bank_years = {
+    "area": (1960, 2019),
+    "smoking": (2010, 2019),
+    "hospital_beds": (2010, 2019),
+    "health_expenditure": (2010, 2019),
+}
+
+# Columns kept from each dataset and their compact dtypes
+dataset_schemas = {
+    **{name: _world_bank_schema(*years) for name, years in world_bank_years.items()},
+    "population": {
+        "Location": "category",
+        "Time": "int16",
+        "AgeGrp": "category",
+        "PopMale": "float64",
+        "PopFemale": "float64",
+    },
+}
+
+
+def load_area_df():
+    area_df = _read_world_bank_csv(AREA_DATASET_PATH, dataset_schemas["area"])
+    area_df["Country Name"] = remap_country_names(
+        area_df["Country Name"], world_bank_country_names
     )
+    return area_df
+
+
+def load_population_df(years=None, chunksize=1_000_000):
+    schema = dataset_schemas["population"]
+    # Most of the WPP file is projections, the requested years are kept while
+    # reading so that the other rows are never held in memory
+    if not years:
+        population_df = _read_csv(POPULATION_DATASET_PATH, schema)
+    elif is_pyarrow_available():
+        population_df = _read_csv_years(POPULATION_DATASET_PATH, schema, years)
+    else:
+        with _read_csv(POPULATION_DATASET_PATH, schema, chunksize=chunksize) as reader:
+            population_df = pd.concat(
+                [chunk.loc[chunk["Time"].between(*years)] for chunk in reader],
+                ignore_index=True,
+            )
+
+    for column in ["Location", "AgeGrp"]:
+        # Chunks may have been parsed with different categories
+        population_df[column] = population_df[column].astype("category")
+    population_df["Location"] = remap_country_names(
+        population_df["Location"], un_wpp_country_names
+    )
+    return population_df
 
 
 def load_smoking_df():
-    return pd.read_csv(SMOKING_DATASET_PATH, skiprows=4)
+    return _read_world_bank_csv(SMOKING_DATASET_PATH, dataset_schemas["smoking"])
 
 
 def load_hospital_beds_df():
-    return pd.read_csv(HOSPITAL_BEDS_DATASET_PATH, skiprows=4)
+    return _read_world_bank_csv(
+        HOSPITAL_BEDS_DATASET_PATH, dataset_schemas["hospital_beds"]
+    )
 
 
 def load_health_expenditure_df():
-    return pd.read_csv(HEALTH_EXPENDITURE_DATASET_PATH, skiprows=4)
+    return _read_world_bank_csv(
+        HEALTH_EXPENDITURE_DATASET_PATH, dataset_schemas["health_expenditure"]
+    )
 
 
-def _download_additional_datasets():
-    _download_data_set(
+def _read_world_bank_csv(path: str, schema: dict) -> pd.DataFrame:
+    # World Bank CSVs start with a few metadata lines before the header; engines
+    # count skipped rows differently, so hand them a file positioned at the header
+    with open(path, "rb") as f:
+        header_position = 0
+        for line in iter(f.readline, b""):
+            if line.startswith(b'"Country Name"'):
+                break
+            header_position = f.tell()
+        f.seek(header_position)
+        return _read_csv(f, schema)
+
+
+def _read_csv(path_or_buffer, schema: dict, **kwargs):
+    if is_pyarrow_available() and "chunksize" not in kwargs:
+        kwargs["engine"] = "pyarrow"
+    return pd.read_csv(path_or_buffer, usecols=list(schema), dtype=schema, **kwargs)
+
+
+def _read_csv_years(path: str, schema: dict, years) -> pd.DataFrame:
+    # Streams record batches through pyarrow and keeps the rows whose Time is in
+    # `years`; categories are read as strings and set by the caller
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv
+
+    column_types = {
+        column: (
+            pa.string() if dtype == "category" else pa.from_numpy_dtype(np.dtype(dtype))
+        )
+        for column, dtype in schema.items()
+    }
+    convert_options = pyarrow.csv.ConvertOptions(
+        include_columns=list(schema), column_types=column_types
+    )
+    first_year, last_year = years
+    with pyarrow.csv.open_csv(path, convert_options=convert_options) as reader:
+        batches = [
+            batch.filter(
+                pc.and_(
+                    pc.greater_equal(batch["Time"], first_year),
+                    pc.less_equal(batch["Time"], last_year),
+                )
+            )
+            for batch in reader
+        ]
+        table = pa.Table.from_batches(batches, schema=reader.schema)
+    return table.to_pandas()
+
+
+# (target dir, zip filename, url, CSV path for archives with a single needed CSV)
+additional_datasets = [
+    (
         AREA_DIR,
         "area.zip",
         "http://api.worldbank.org/v2/en/indicator/AG.LND.TOTL.K2?downloadformat=csv",
-    )
-    _download_data_set(
+        None,
+    ),
+    (
         SMOKING_DIR,
         "smoking.zip",
         "http://api.worldbank.org/v2/en/indicator/SH.PRV.SMOK?downloadformat=csv",
-    )
-    _download_data_set(
+        None,
+    ),
+    (
         HOSPITAL_BEDS_DIR,
         "hospital_beds.zip",
         "http://api.worldbank.org/v2/en/indicator/SH.MED.BEDS.ZS?downloadformat=csv",
-    )
-    _download_data_set(
+        None,
+    ),
+    (
         HEALTH_EXPENDITURE_DIR,
         "health_expenditure.zip",
         "http://api.worldbank.org/v2/en/indicator/SH.XPD.CHEX.PP.CD?downloadformat=csv",
-    )
-
-    url = "https://github.com/ordinaryevidence/leep-cea/raw/refs/heads/master/WPP2019_PopulationByAgeSex_Medium.zip"
-    os.makedirs(POPULATION_DIR, exist_ok=True)
-
-    response = requests.get(url)
-    response.raise_for_status()
-    zipfile_bytes = io.BytesIO(response.content)
-
-    with zipfile.ZipFile(zipfile_bytes) as z:
-        csv_filename = [f for f in z.namelist() if f.endswith(".csv")][0]
-        with z.open(csv_filename) as csvfile, open(
-            POPULATION_DATASET_PATH, "wb"
-        ) as out_file:
-            out_file.write(csvfile.read())
-
+        None,
+    ),
+    (
+        POPULATION_DIR,
+        "WPP2019_PopulationByAgeSex_Medium.zip",
+        "https://github.com/ordinaryevidence/leep-cea/raw/refs/heads/master/WPP2019_PopulationByAgeSex_Medium.zip",
+        POPULATION_DATASET_PATH,
+    ),
+]
 
-def _download_data_set(dir_name: str, zip_filename: str, url: str):
-    os.makedirs(dir_name, exist_ok=True)
-    zip_path = os.path.join(dir_name, zip_filename)
 
-    if not os.path.exists(zip_path):
-        urllib.request.urlretrieve(url, zip_path)
-        print(f"Downloaded {zip_filename}")
-    else:
-        print(f"{zip_filename} already exists, skipping download.")
-
-    with zipfile.ZipFile(zip_path, "r") as zip_ref:
-        for file in zip_ref.namelist():
-            dest_path = os.path.join(dir_name, file)
-            if not os.path.exists(dest_path):
-                zip_ref.extract(file, dir_name)
-                print(f"Extracted: {file}")
-            else:
-                print(f"Skipped (already exists): {file}")
+def _download_additional_datasets():
+    download_datasets(additional_datasets)
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import geopy.distance
+
+from assignment.utils import get_location_coords
+
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 ellipsoid, as used by geopy.distance.distance
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B_KM = WGS84_A_KM * (1 - WGS84_F)
+
+
+def haversine_km(lat, long, origin_lat, origin_long):
+    lat, long = np.radians(lat), np.radians(long)
+    origin_lat, origin_long = np.radians(origin_lat), np.radians(origin_long)
+
+    a = (
+        np.sin((lat - origin_lat) / 2) ** 2
+        + np.cos(lat) * np.cos(origin_lat) * np.sin((long - origin_long) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_km(lat, long, origin_lat, origin_long, max_iterations=200):
+    lat = np.asarray(lat, dtype="float64")
+    long = np.asarray(long, dtype="float64")
+
+    u1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat)))
+    u2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(origin_lat)))
+    delta_long = np.radians(origin_long - long)
+
+    # Lanes stop iterating once they converge and keep their final values, so
+    # each distance is the same whatever other points it is computed with
+    lambda_ = delta_long.copy()
+    converged = np.zeros(lambda_.shape, dtype=bool)
+    sin_sigma, cos_sigma, sigma, cos2_alpha, cos_2sigma_m = (
+        np.zeros(lambda_.shape) for _ in range(5)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(max_iterations):
+            i = np.flatnonzero(~converged)
+            if not len(i):
+                break
+            lane_u1, lane_lambda = u1[i], lambda_[i]
+            sin_sigma[i] = np.sqrt(
+                (np.cos(u2) * np.sin(lane_lambda)) ** 2
+                + (
+                    np.cos(lane_u1) * np.sin(u2)
+                    - np.sin(lane_u1) * np.cos(u2) * np.cos(lane_lambda)
+                )
+                ** 2
+            )
+            cos_sigma[i] = np.sin(lane_u1) * np.sin(u2) + np.cos(lane_u1) * np.cos(
+                u2
+            ) * np.cos(lane_lambda)
+            sigma[i] = np.arctan2(sin_sigma[i], cos_sigma[i])
+            sin_alpha = (
+                np.cos(lane_u1) * np.cos(u2) * np.sin(lane_lambda) / sin_sigma[i]
+            )
+            cos2_alpha[i] = 1 - sin_alpha**2
+            # Equatorial lines have cos2_alpha == 0
+            cos_2sigma_m[i] = np.where(
+                cos2_alpha[i] != 0,
+                cos_sigma[i] - 2 * np.sin(lane_u1) * np.sin(u2) / cos2_alpha[i],
+                0.0,
+            )
+            c = WGS84_F / 16 * cos2_alpha[i] * (4 + WGS84_F * (4 - 3 * cos2_alpha[i]))
+            lambda_[i] = delta_long[i] + (1 - c) * WGS84_F * sin_alpha * (
+                sigma[i]
+                + c
+                * sin_sigma[i]
+                * (cos_2sigma_m[i] + c * cos_sigma[i] * (-1 + 2 * cos_2sigma_m[i] ** 2))
+            )
+            converged[i] = np.abs(lambda_[i] - lane_lambda) < 1e-12
+
+        u_squared = cos2_alpha * (WGS84_A_KM**2 - WGS84_B_KM**2) / WGS84_B_KM**2
+        a = 1 + u_squared / 16384 * (
+            4096 + u_squared * (-768 + u_squared * (320 - 175 * u_squared))
+        )
+        b = (
+            u_squared
+            / 1024
+            * (256 + u_squared * (-128 + u_squared * (74 - 47 * u_squared)))
+        )
+        delta_sigma = (
+            b
+            * sin_sigma
+            * (
+                cos_2sigma_m
+                + b
+                / 4
+                * (
+                    cos_sigma * (-1 + 2 * cos_2sigma_m**2)
+                    - b
+                    / 6
+                    * cos_2sigma_m
+                    * (-3 + 4 * sin_sigma**2)
+                    * (-3 + 4 * cos_2sigma_m**2)
+                )
+            )
+        )
+        distances = WGS84_B_KM * a * (sigma - delta_sigma)
+
+    distances = np.where(sin_sigma == 0, 0.0, distances)
+
+    # Vincenty does not converge for nearly antipodal points
+    for i in np.flatnonzero(~converged & (sin_sigma != 0)):
+        distances[i] = geopy.distance.distance(
+            (lat[i], long[i]), (origin_lat, origin_long)
+        ).km
+    return distances
+
+
+distance_methods = {"haversine": haversine_km, "vincenty": vincenty_km}
+
+
+def resolve_origins(df: pd.DataFrame, origins: dict) -> dict:
+    # Named origins are looked up in `df`, (Lat, Long) origins are kept as is
+    return {
+        origin_name: (
+            get_location_coords(df, *origin) if isinstance(origin[0], str) else origin
+        )
+        for origin_name, origin in origins.items()
+    }
+
+
+def add_distance_features(
+    df: pd.DataFrame, origins: dict, method: str = "vincenty"
+) -> pd.DataFrame:
+    # Each location repeats for every date, so only unique coordinates are computed
+    coords, coords_ids = np.unique(
+        df[["Lat", "Long"]].to_numpy(dtype="float64"), axis=0, return_inverse=True
+    )
+    distance_fn = distance_methods[method]
+
+    for origin_name, origin in resolve_origins(df, origins).items():
+        distances = distance_fn(coords[:, 0], coords[:, 1], *origin)
+        df[f"Distance_to_{origin_name}"] = distances[coords_ids.ravel()]
+    return df
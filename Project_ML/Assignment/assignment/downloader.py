@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+
+from assignment.config import DOWNLOADS_MANIFEST_PATH
+
+CHUNK_SIZE = 1 << 20
+
+
+def download_datasets(datasets, max_workers: int = 4, manifest_path=None):
+    # `datasets` holds (dir, zip filename, url, csv path) tuples; with a csv path
+    # only the first CSV of the archive is extracted there, otherwise everything
+    manifest_path = manifest_path or DOWNLOADS_MANIFEST_PATH
+    manifest = _read_manifest(manifest_path)
+
+    # Threads only return their entries and a summary line, which is printed
+    # here as each dataset finishes so that the lines do not interleave
+    entries = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_fetch_dataset, *dataset, manifest): dataset[2]
+            for dataset in datasets
+        }
+        for future in as_completed(futures):
+            entries[futures[future]], summary = future.result()
+            print(summary)
+
+    manifest.update(entries)
+    _write_manifest(manifest, manifest_path)
+
+
+def _fetch_dataset(dir_name, zip_filename, url, csv_path, manifest):
+    os.makedirs(dir_name, exist_ok=True)
+    zip_path = os.path.join(dir_name, zip_filename)
+    entry = dict(manifest.get(url, {}))
+
+    if csv_path and os.path.exists(csv_path) and not os.path.exists(zip_path):
+        return entry, f"{os.path.basename(csv_path)}: already extracted, skipped"
+
+    if _is_cached(zip_path, entry):
+        summary = f"{zip_filename}: cached"
+    else:
+        entry, resumed_at = _download(url, zip_path, entry)
+        summary = f"{zip_filename}: downloaded {entry['size'] / 2**20:.1f} MB"
+        if resumed_at:
+            summary += f" (resumed at {resumed_at / 2**20:.1f} MB)"
+
+    extracted, skipped = _extract(zip_path, dir_name, csv_path)
+    summary += f", extracted {extracted} files"
+    if skipped:
+        summary += f", {skipped} already there"
+    return entry, summary
+
+
+def _is_cached(zip_path, entry):
+    if not os.path.exists(zip_path):
+        return False
+    if "sha256" not in entry:
+        # Archive from before the manifest existed, adopt it if it is intact
+        if not zipfile.is_zipfile(zip_path):
+            return False
+        entry.update(sha256=_sha256(zip_path), size=os.path.getsize(zip_path))
+        return True
+    return (
+        os.path.getsize(zip_path) == entry["size"]
+        and _sha256(zip_path) == entry["sha256"]
+    )
+
+
+def _download(url, zip_path, entry):
+    part_path = zip_path + ".part"
+    etag_path = part_path + ".etag"
+
+    headers = {}
+    if os.path.exists(part_path) and os.path.exists(etag_path):
+        with open(etag_path) as f:
+            # Resume only if the server still has the same file
+            headers = {
+                "Range": f"bytes={os.path.getsize(part_path)}-",
+                "If-Range": f.read(),
+            }
+
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        etag = response.headers.get("ETag")
+        if etag:
+            with open(etag_path, "w") as f:
+                f.write(etag)
+
+        resumed_at = os.path.getsize(part_path) if response.status_code == 206 else 0
+        with open(part_path, "ab" if resumed_at else "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+    if os.path.exists(etag_path):
+        os.remove(etag_path)
+    if not zipfile.is_zipfile(part_path):
+        os.remove(part_path)
+        raise RuntimeError(f"Downloaded file from {url} is not a valid zip archive")
+
+    os.replace(part_path, zip_path)
+    entry = {
+        "etag": etag,
+        "sha256": _sha256(zip_path),
+        "size": os.path.getsize(zip_path),
+    }
+    return entry, resumed_at
+
+
+def _extract(zip_path, dir_name, csv_path):
+    # Returns the number of extracted and of already existing members
+    extracted, skipped = 0, 0
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        if csv_path:
+            members = [f for f in zip_ref.namelist() if f.endswith(".csv")][:1]
+            targets = [csv_path]
+        else:
+            members = zip_ref.namelist()
+            targets = [os.path.join(dir_name, f) for f in members]
+
+        for member, dest_path in zip(members, targets):
+            if os.path.exists(dest_path):
+                skipped += 1
+                continue
+            # Stream the member to disk instead of reading it into memory
+            tmp_path = dest_path + ".tmp"
+            with zip_ref.open(member) as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            os.replace(tmp_path, dest_path)
+            extracted += 1
+    return extracted, skipped
+
+
+def _sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _read_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest, manifest_path):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
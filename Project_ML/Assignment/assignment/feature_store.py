@@ -0,0 +1,345 @@
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+import pandas as pd
+
+from assignment import config
+from assignment.config import (
+    AREA_DATASET_PATH,
+    POPULATION_DATASET_PATH,
+    SMOKING_DATASET_PATH,
+    HEALTH_EXPENDITURE_DATASET_PATH,
+    DAYS_HISTORY_SIZE,
+    DISTANCE_METHOD,
+    POPULATION_YEARS,
+    STREAMING_CHUNK_LOCATIONS,
+    distance_origins,
+    location_columns,
+)
+from assignment.utils import is_pyarrow_available, print_memory_usage
+from assignment.instrumentation import instrumented
+
+# Bump whenever `process_data` output changes for the same inputs
+FEATURE_STORE_VERSION = 7
+
+
+def _input_dataset_paths():
+    # Read at call time, the CLI may point the Kaggle CSVs elsewhere
+    return [
+        config.COVID19_TRAIN_DATASET_PATH,
+        config.COVID19_TEST_DATASET_PATH,
+        AREA_DATASET_PATH,
+        POPULATION_DATASET_PATH,
+        SMOKING_DATASET_PATH,
+        HEALTH_EXPENDITURE_DATASET_PATH,
+    ]
+
+
+@instrumented("load_processed_data")
+def load_processed_data(
+    days_history_size: int = DAYS_HISTORY_SIZE,
+    use_cache: bool = True,
+    compact: bool = False,
+    memory_profile: bool = False,
+    jobs: int = 1,
+) -> pd.DataFrame:
+    processed_df = _load_processed_data(days_history_size, use_cache, jobs)
+
+    if memory_profile:
+        print_memory_usage(processed_df=processed_df)
+    if compact:
+        from assignment.features import compact_processed_df
+
+        processed_df = compact_processed_df(processed_df)
+        if memory_profile:
+            print_memory_usage(compact_processed_df=processed_df)
+    return processed_df
+
+
+def _load_processed_data(
+    days_history_size: int, use_cache: bool, jobs: int = 1
+) -> pd.DataFrame:
+    use_cache = use_cache and _is_parquet_available()
+
+    if use_cache:
+        fingerprint = _input_fingerprint(days_history_size)
+        path = _entry_path(fingerprint)
+        if path and os.path.exists(path):
+            print(f"Loading processed features from: {path}")
+            return pd.read_parquet(path, memory_map=True)
+
+        previous_entry = fingerprint and _find_appended_entry(fingerprint)
+        if previous_entry:
+            processed_df, dropped_locations = _update_entry(
+                previous_entry, days_history_size
+            )
+            _save_processed_data(
+                processed_df, path, fingerprint, dropped_locations=dropped_locations
+            )
+            return processed_df
+
+    # The feature code (geopy, the downloader) is only imported on a cache miss
+    from assignment.data_load import load_data
+    from assignment.features import process_data
+
+    main_df = load_data()
+    raw_locations = _locations(main_df)
+    processed_df = process_data(main_df, days_history_size=days_history_size, jobs=jobs)
+
+    if use_cache:
+        # Inputs may have been downloaded by `load_data`, so hash them again
+        fingerprint = _input_fingerprint(days_history_size)
+        _save_processed_data(
+            processed_df,
+            _entry_path(fingerprint),
+            fingerprint,
+            dropped_locations=raw_locations - _locations(processed_df),
+        )
+
+    return processed_df
+
+
+def feature_store_key(days_history_size: int = DAYS_HISTORY_SIZE):
+    return _fingerprint_key(_input_fingerprint(days_history_size))
+
+
+def _fingerprint_key(fingerprint):
+    if fingerprint is None:
+        return None
+    key = fingerprint["params_sha256"] + fingerprint["train_sha256"]
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _input_fingerprint(days_history_size: int):
+    # train.csv is hashed on its own, so that an entry built before rows were
+    # appended to it can be recognised and updated incrementally
+    input_paths = _input_dataset_paths()
+    if not all(os.path.exists(path) for path in input_paths):
+        return None
+
+    hasher = hashlib.sha256()
+    params = {
+        "version": FEATURE_STORE_VERSION,
+        "last_train_date": str(config.LAST_TRAIN_DATE),
+        "last_eval_date": str(config.LAST_EVAL_DATE),
+        "last_test_date": str(config.LAST_TEST_DATE),
+        "days_history_size": days_history_size,
+        "distance_origins": distance_origins,
+        "distance_method": DISTANCE_METHOD,
+        "population_years": POPULATION_YEARS,
+    }
+    hasher.update(json.dumps(params, sort_keys=True).encode())
+    for path in input_paths:
+        if path == config.COVID19_TRAIN_DATASET_PATH:
+            continue
+        hasher.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+
+    train_size = os.path.getsize(config.COVID19_TRAIN_DATASET_PATH)
+    return {
+        "params_sha256": hasher.hexdigest(),
+        "train_size": train_size,
+        "train_sha256": _sha256_prefix(config.COVID19_TRAIN_DATASET_PATH, train_size),
+    }
+
+
+def _sha256_prefix(path: str, size: int) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while size > 0:
+            chunk = f.read(min(size, 1 << 20))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size -= len(chunk)
+    return hasher.hexdigest()
+
+
+def _find_appended_entry(fingerprint: dict):
+    # An entry whose train.csv is a prefix of the current one, everything else equal
+    for metadata_path in glob.glob(
+        os.path.join(config.FEATURE_STORE_DIR, "processed_*.json")
+    ):
+        with open(metadata_path) as f:
+            entry = json.load(f)
+        if (
+            entry["params_sha256"] == fingerprint["params_sha256"]
+            and entry["train_size"] < fingerprint["train_size"]
+            and os.path.exists(metadata_path[: -len(".json")] + ".parquet")
+            and _sha256_prefix(config.COVID19_TRAIN_DATASET_PATH, entry["train_size"])
+            == entry["train_sha256"]
+        ):
+            entry["path"] = metadata_path[: -len(".json")] + ".parquet"
+            return entry
+    return None
+
+
+def _update_entry(entry: dict, days_history_size: int):
+    from assignment.data_load import fix_cruise_ship_locations
+    from assignment.features import update_processed_data
+
+    print(f"Updating processed features from {entry['path']} with appended rows")
+    with open(config.COVID19_TRAIN_DATASET_PATH, "rb") as f:
+        header = f.readline()
+        f.seek(entry["train_size"])
+        appended = f.read()
+    new_df = pd.read_csv(io.BytesIO(header + appended), parse_dates=["Date"])
+    new_df = fix_cruise_ship_locations(new_df)
+
+    processed_df = pd.read_parquet(entry["path"])
+    dropped_locations = set(map(tuple, entry["dropped_locations"]))
+    all_locations = _locations(processed_df) | _locations(new_df)
+    processed_df = update_processed_data(
+        processed_df,
+        new_df,
+        days_history_size=days_history_size,
+        dropped_locations=dropped_locations,
+    )
+    dropped_locations |= all_locations - _locations(processed_df)
+    return processed_df, dropped_locations
+
+
+def _locations(df: pd.DataFrame) -> set:
+    locations_df = df[location_columns].fillna({"Province/State": ""})
+    return set(map(tuple, locations_df.drop_duplicates().to_numpy()))
+
+
+def _entry_path(fingerprint):
+    key = _fingerprint_key(fingerprint)
+    if key is None:
+        return None
+    return os.path.join(config.FEATURE_STORE_DIR, f"processed_{key}.parquet")
+
+
+def _save_processed_data(
+    processed_df: pd.DataFrame, path: str, fingerprint: dict, dropped_locations=()
+):
+    os.makedirs(config.FEATURE_STORE_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    processed_df.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+    # Lets a later run with rows appended to train.csv update this entry
+    metadata = {**fingerprint, "dropped_locations": sorted(dropped_locations)}
+    with open(path[: -len(".parquet")] + ".json", "w") as f:
+        json.dump(metadata, f)
+
+    # Entries for older inputs can never be hit again
+    for stale_path in glob.glob(os.path.join(config.FEATURE_STORE_DIR, "processed_*")):
+        if os.path.splitext(stale_path)[0] != os.path.splitext(path)[0]:
+            os.remove(stale_path)
+
+    print(f"Processed features saved to {path}")
+
+
+def load_processed_dataset(
+    days_history_size: int = DAYS_HISTORY_SIZE,
+    chunk_locations: int = STREAMING_CHUNK_LOCATIONS,
+) -> str:
+    # Streaming counterpart of `load_processed_data`: the features are written
+    # chunk by chunk to a Parquet dataset, whose directory is returned
+    if not is_pyarrow_available():
+        raise RuntimeError("Streaming features need pyarrow, please install it.")
+
+    directory = _feature_dataset_path(days_history_size)
+    if directory and os.path.exists(directory):
+        print(f"Using processed feature dataset: {directory}")
+        return directory
+
+    from assignment.data_load import load_data
+    from assignment.features import iter_processed_chunks
+
+    main_df = load_data()
+    chunks = iter_processed_chunks(main_df, days_history_size, chunk_locations)
+    directory = _feature_dataset_path(days_history_size)
+    write_feature_dataset(chunks, directory)
+    return directory
+
+
+def write_feature_dataset(chunks, directory: str):
+    # One Parquet file per chunk with one row group per date, so the dataset
+    # can be read back date by date without loading a whole file
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tmp_directory = directory + ".tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    parts = []
+    for part_idx, chunk_df in enumerate(chunks):
+        path = f"part-{part_idx:05d}.parquet"
+        dates, writer = [], None
+        for date, day_df in chunk_df.groupby("Date", sort=True):
+            table = pa.Table.from_pandas(day_df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    os.path.join(tmp_directory, path), table.schema
+                )
+            writer.write_table(table.cast(writer.schema))
+            dates.append(str(date.date()))
+        if writer is None:  # every location of the chunk was dropped
+            continue
+        writer.close()
+        parts.append({"path": path, "dates": dates, "rows": len(chunk_df)})
+
+    with open(os.path.join(tmp_directory, "dataset.json"), "w") as f:
+        json.dump({"parts": parts}, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+
+    # Datasets of older inputs can never be used again
+    for stale_directory in glob.glob(
+        os.path.join(config.FEATURE_STORE_DIR, "dataset_*")
+    ):
+        if stale_directory != directory:
+            shutil.rmtree(stale_directory, ignore_errors=True)
+
+    print(f"Processed feature dataset saved to {directory}")
+
+
+def iter_feature_dataset_days(directory: str, first_date=None, last_date=None):
+    # Yields (date, rows of all locations for that date) in date order
+    import pyarrow.parquet as pq
+
+    with open(os.path.join(directory, "dataset.json")) as f:
+        parts = json.load(f)["parts"]
+
+    row_groups = {}
+    for part in parts:
+        for row_group, date in enumerate(part["dates"]):
+            row_groups.setdefault(date, []).append((part["path"], row_group))
+
+    files = {}
+    for date in sorted(row_groups):
+        if first_date is not None and pd.Timestamp(date) < first_date:
+            continue
+        if last_date is not None and pd.Timestamp(date) > last_date:
+            continue
+
+        tables = []
+        for path, row_group in row_groups[date]:
+            if path not in files:
+                files[path] = pq.ParquetFile(os.path.join(directory, path))
+            tables.append(files[path].read_row_group(row_group).to_pandas())
+        yield pd.Timestamp(date), pd.concat(tables, ignore_index=True)
+
+
+def _feature_dataset_path(days_history_size: int):
+    key = feature_store_key(days_history_size)
+    if key is None:
+        return None
+    return os.path.join(config.FEATURE_STORE_DIR, f"dataset_{key}")
+
+
+def _is_parquet_available():
+    if not is_pyarrow_available():
+        print("pyarrow is not installed, processed features will not be cached.")
+        return False
+    return True
@@ -1,59 +1,258 @@
 import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import List
-import geopy.distance
-import re
 
+from assignment.config import (
+    DAYS_HISTORY_SIZE,
+    DISTANCE_METHOD,
+    POPULATION_YEARS,
+    STREAMING_CHUNK_LOCATIONS,
+    compact_float64_columns,
+    compact_int16_columns,
+    distance_origins,
+    location_columns,
+)
 from assignment.data_load import (
     load_area_df,
     load_health_expenditure_df,
     load_population_df,
     load_smoking_df,
+    world_bank_years,
 )
-from assignment.utils import (
-    get_hubei_coords,
-    merge_with_column_drop,
-    remap_country_name_from_world_bank_to_df_name,
-    remap_country_name_from_un_wpp_to_df_name,
-)
+from assignment.distance import add_distance_features, resolve_origins
+from assignment.instrumentation import instrumented
+from assignment.utils import join_country_features
+
+# Columns of the combined train.csv / test.csv rows
+main_raw_columns = [
+    "Id",
+    "ForecastId",
+    "Province/State",
+    "Country/Region",
+    "Lat",
+    "Long",
+    "Date",
+    "ConfirmedCases",
+    "Fatalities",
+]
+days_since_thresholds = [1, 10, 100]
+
+# World Bank indicators merged into the features: (column, loader, years)
+world_bank_indicators = [
+    ("CountryArea", load_area_df, world_bank_years["area"]),
+    ("CountrySmokingRate", load_smoking_df, world_bank_years["smoking"]),
+    (
+        "CountryHealthExpenditurePerCapitaPPP",
+        load_health_expenditure_df,
+        world_bank_years["health_expenditure"],
+    ),
+]
+
+
+@instrumented("process_data")
+def process_data(
+    main_df: pd.DataFrame, days_history_size: int = DAYS_HISTORY_SIZE, jobs: int = 1
+) -> pd.DataFrame:
+    if jobs > 1:
+        return _process_data_in_parallel(main_df, days_history_size, jobs)
+
+    main_df = process_location(main_df, days_history_size=days_history_size)
+
+    main_df = process_confirmed_case_and_fatality(main_df)
+
+    # Static country-level features are built once per country and attached with
+    # a single join instead of widening the daily frame once per source
+    country_df = build_country_features(main_df["Country/Region"].unique())
+    main_df = join_country_features(main_df, country_df)
+    main_df.reset_index(drop=True, inplace=True)
 
+    return main_df
 
-def process_data(main_df: pd.DataFrame) -> pd.DataFrame:
-    main_df = process_location(main_df)
 
-    main_df, world_bank_converters, un_wpp_converters = (
-        process_confirmed_case_and_fatality(main_df)
-    )
+def _process_data_in_parallel(
+    main_df: pd.DataFrame, days_history_size: int, jobs: int
+) -> pd.DataFrame:
+    # A few chunks per worker so that uneven chunks still keep every worker busy
+    n_locations = main_df.groupby(location_columns, dropna=False).ngroups
+    chunk_locations = max(1, -(-n_locations // (jobs * 4)))
+    chunk_params = _chunk_params(main_df, days_history_size)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunks = list(
+            executor.map(
+                _process_chunk,
+                _iter_location_chunks(main_df, chunk_locations),
+                repeat(chunk_params),
+            )
+        )
+
+    # Chunks keep the index of `main_df`, restoring it followed by the stable
+    # date sort gives the row order of the single-process path
+    main_df = pd.concat(chunks).sort_index(kind="stable")
+    main_df.sort_values(by="Date", kind="stable", inplace=True)
+    main_df.reset_index(drop=True, inplace=True)
+    return main_df
 
-    # Area
-    area_df = load_area_df(world_bank_converters)
-    area_df = process_area_df(area_df)
-    main_df = merge_with_column_drop(main_df, area_df, right_df_column="Country Name")
 
-    # Population
-    population_df = load_population_df(un_wpp_converters)
-    aggregated_population_df = process_population_df(population_df)
-    main_df = merge_with_column_drop(
-        main_df, aggregated_population_df, right_df_column="Location"
+def iter_processed_chunks(
+    main_df: pd.DataFrame,
+    days_history_size: int = DAYS_HISTORY_SIZE,
+    chunk_locations: int = STREAMING_CHUNK_LOCATIONS,
+):
+    # Yields the rows of `process_data` for `chunk_locations` locations at a time,
+    # so only the raw panel and one chunk of lag columns are in memory at once
+    chunk_params = _chunk_params(main_df, days_history_size)
+    for chunk_df in _iter_location_chunks(main_df, chunk_locations):
+        chunk_df = _process_chunk(chunk_df, chunk_params)
+        chunk_df.reset_index(drop=True, inplace=True)
+        yield chunk_df
+
+
+def _chunk_params(main_df: pd.DataFrame, days_history_size: int) -> dict:
+    # Everything a chunk needs from the whole panel
+    locations_df = main_df[location_columns + ["Lat", "Long"]].fillna(
+        {"Province/State": ""}
     )
+    return {
+        "days_history_size": days_history_size,
+        "origins": resolve_origins(locations_df, distance_origins),
+        "first_date": main_df["Date"].min(),
+        "country_df": build_country_features(main_df["Country/Region"].unique()),
+    }
+
+
+def _iter_location_chunks(main_df: pd.DataFrame, chunk_locations: int):
+    location_ids = main_df.groupby(location_columns, sort=False, dropna=False).ngroup()
+    chunk_ids = location_ids.to_numpy() // chunk_locations
+    order = np.argsort(chunk_ids, kind="stable")
+    boundaries = np.flatnonzero(np.diff(chunk_ids[order])) + 1
+
+    for chunk_rows in np.split(order, boundaries):
+        yield main_df.iloc[chunk_rows].copy()
 
-    # Density
-    main_df = _add_country_population_density(main_df)
 
-    # Smoking
-    smoking_df = load_smoking_df()
-    smoking_df = process_smoking_df(smoking_df)
-    main_df = merge_with_column_drop(
-        main_df, smoking_df, right_df_column="Country Name"
+def _process_chunk(chunk_df: pd.DataFrame, chunk_params: dict) -> pd.DataFrame:
+    chunk_df = process_location(
+        chunk_df, days_history_size=chunk_params["days_history_size"]
     )
+    chunk_df = process_confirmed_case_and_fatality(
+        chunk_df,
+        origins=chunk_params["origins"],
+        first_date=chunk_params["first_date"],
+    )
+    return join_country_features(chunk_df, chunk_params["country_df"])
+
+
+@instrumented("update_processed_data")
+def update_processed_data(
+    processed_df: pd.DataFrame,
+    new_df: pd.DataFrame,
+    dropped_locations,
+    days_history_size: int = DAYS_HISTORY_SIZE,
+) -> pd.DataFrame:
+    # Adds raw training rows (train.csv schema) appended after `processed_df` was
+    # built. Lags are recomputed only from the first new date of each touched
+    # location on, using its stored tail, instead of over the whole history.
+    # `dropped_locations`, the locations dropped when `processed_df` was built,
+    # stay dropped
+    new_df = new_df.fillna({"Province/State": ""})
+    raw_columns = [c for c in main_raw_columns if c in processed_df.columns]
+    new_df = new_df.reindex(columns=raw_columns)
+    new_locations = pd.MultiIndex.from_frame(new_df[location_columns])
+    new_df = new_df.loc[~new_locations.isin(list(dropped_locations))]
+
+    # Like `load_data`, forecast rows are only kept after the last training date
+    replaced = processed_df["Id"].isna() & (
+        processed_df["Date"] <= new_df["Date"].max()
+    )
+    changes_df = pd.concat([new_df, processed_df.loc[replaced, raw_columns]])
+    first_changed = changes_df.groupby(location_columns)["Date"].min()
+
+    locations = pd.MultiIndex.from_frame(processed_df[location_columns])
+    is_touched = locations.isin(first_changed.index)
+    touched_df = processed_df.loc[is_touched & ~replaced]
+    touched_first_changed = first_changed.reindex(
+        pd.MultiIndex.from_frame(touched_df[location_columns])
+    ).to_numpy()
+
+    # Rows before the first change keep their features, the last of them
+    # provide the lags of the changed rows
+    is_kept = (touched_df["Date"] < touched_first_changed).to_numpy()
+    kept_df = touched_df.loc[is_kept]
+    context_df = kept_df.groupby(location_columns).tail(days_history_size + 1)
+    window_df = pd.concat(
+        [context_df[raw_columns], touched_df.loc[~is_kept, raw_columns], new_df],
+        ignore_index=True,
+    )
+    window_df = process_location(window_df, days_history_size=days_history_size)
 
-    # Health expenditure
-    health_expenditure_df = load_health_expenditure_df()
-    health_expenditure_df = process_health_expenditure_df(health_expenditure_df)
-    main_df = merge_with_column_drop(
-        main_df, health_expenditure_df, right_df_column="Country Name"
+    # Locations whose new rows break the cumulative series are dropped entirely
+    valid_locations = pd.MultiIndex.from_frame(window_df[location_columns])
+    kept_df = kept_df.loc[
+        pd.MultiIndex.from_frame(kept_df[location_columns]).isin(valid_locations)
+    ]
+    window_first_changed = first_changed.reindex(valid_locations).to_numpy()
+    window_df = window_df.loc[(window_df["Date"] >= window_first_changed).to_numpy()]
+
+    first_date = (
+        processed_df["Date"] - pd.to_timedelta(processed_df["Day"], "D")
+    ).min()
+    window_df = process_confirmed_case_and_fatality(
+        window_df,
+        origins=resolve_origins(processed_df, distance_origins),
+        first_date=first_date,
     )
+    window_df = join_country_features(
+        window_df, _country_features_of(processed_df, kept_df, window_df)
+    )
+
+    # Days since the first case depend on the whole series of a location
+    updated_df = pd.concat([kept_df, window_df], ignore_index=True)
+    updated_df = _add_days_since_features(updated_df, days_since_thresholds)
+
+    main_df = pd.concat(
+        [processed_df.loc[~is_touched], updated_df[processed_df.columns]],
+        ignore_index=True,
+    )
+    main_df.sort_values(by="Date", kind="stable", inplace=True)
+    main_df.reset_index(drop=True, inplace=True)
+    return main_df
+
+
+def _country_features_of(processed_df, kept_df, window_df) -> pd.DataFrame:
+    # Country features are reused from the stored rows, only countries seen for
+    # the first time are built from the datasets
+    country_columns = [c for c in processed_df.columns if c not in window_df.columns]
+    country_df = kept_df.drop_duplicates("Country/Region").set_index("Country/Region")[
+        country_columns
+    ]
+    new_countries = window_df.loc[
+        ~window_df["Country/Region"].isin(country_df.index), "Country/Region"
+    ].unique()
+    if len(new_countries):
+        new_country_df = build_country_features(new_countries)[country_columns]
+        country_df = pd.concat([country_df, new_country_df])
+    return country_df
+
+
+def compact_processed_df(main_df: pd.DataFrame) -> pd.DataFrame:
+    # Both location columns share one dictionary of names
+    location_names = pd.unique(main_df[location_columns].to_numpy().ravel())
+    location_dtype = pd.CategoricalDtype(sorted(location_names))
+    for column in location_columns:
+        main_df[column] = main_df[column].astype(location_dtype)
+
+    for column in compact_int16_columns:
+        main_df[column] = main_df[column].astype("int16")
 
+    float_columns = [
+        c
+        for c in main_df.select_dtypes("float64").columns
+        if c not in compact_float64_columns
+    ]
+    main_df[float_columns] = main_df[float_columns].astype("float32")
     return main_df
 
 
@@ -63,25 +262,26 @@ def process_data(main_df: pd.DataFrame) -> pd.DataFrame:
 def _preprocess_location(
     df: pd.DataFrame, location_columns: List[str] = ["Country/Region", "Province/State"]
 ):
-    df.sort_values(by="Date", inplace=True)
+    # Stable, so that rows of a date keep their order whatever the partitioning
+    df.sort_values(by="Date", kind="stable", inplace=True)
     for column in location_columns:
         df[column].fillna("", inplace=True)
     return df
 
 
-def _is_cumulative(increment_series):
-    for v in increment_series:
-        if (not np.isnan(v)) and (v < 0):
-            return False
-    return True
+def _is_cumulative(increment_values: np.ndarray, group_ids: np.ndarray, n_groups: int):
+    negative_counts = np.bincount(group_ids[increment_values < 0], minlength=n_groups)
+    return negative_counts == 0
 
 
-def _add_prev_day_columns(df: pd.DataFrame, days_history_size: int = 30):
-    for field in ["LogNewConfirmedCases", "LogNewFatalities"]:
-        df[field] = np.nan
-        for prev_day in range(1, days_history_size + 1):
-            df[f"{field}_prev_day_{prev_day}"] = np.nan
-    return df
+def _shift_within_groups(
+    values: np.ndarray, group_positions: np.ndarray, periods: int
+) -> np.ndarray:
+    # `values` must be ordered by group, then by date
+    shifted = np.full(len(values), np.nan)
+    shifted[periods:] = values[:-periods]
+    shifted[group_positions < periods] = np.nan
+    return shifted
 
 
 def _process_location_group(
@@ -89,129 +289,183 @@ def _process_location_group(
     days_history_size: int = 30,
     location_columns: List[str] = ["Country/Region", "Province/State"],
 ):
-    for location_name, location_df in df.groupby(location_columns):
-        for field in ["ConfirmedCases", "Fatalities"]:
-            new_values = location_df[field].values.copy()
-            new_values[1:] -= new_values[:-1]
-            if not _is_cumulative(new_values):
-                print(
-                    f"{field} for {location_name} is not valid cumulative series, drop it"
-                )
-                df.drop(index=location_df.index, inplace=True)
-                break
+    grouped = df.groupby(location_columns, sort=False)
+    n_groups = grouped.ngroups
+    location_ids = grouped.ngroup().to_numpy()
+    order = np.argsort(location_ids, kind="stable")
+    group_ids = location_ids[order]
+    group_positions = grouped.cumcount().to_numpy()[order]
+    first_rows = order[group_positions == 0]
+
+    is_valid = np.ones(n_groups, dtype=bool)
+    dropped_locations = []
+    lag_columns = {}
+    for field in ["ConfirmedCases", "Fatalities"]:
+        values = df[field].to_numpy(dtype="float64")[order]
+        new_values = values - _shift_within_groups(values, group_positions, 1)
+        new_values[group_positions == 0] = values[group_positions == 0]
+
+        is_field_valid = _is_cumulative(new_values, group_ids, n_groups)
+        for group_id in np.flatnonzero(is_valid & ~is_field_valid):
+            location_name = tuple(df[location_columns].iloc[first_rows[group_id]])
+            dropped_locations.append((location_name, field))
+        is_valid &= is_field_valid
+
+        # Series of dropped locations may contain negative increments
+        with np.errstate(divide="ignore", invalid="ignore"):
             log_new_values = np.log1p(new_values)
-            df.loc[location_df.index, f"LogNew{field}"] = log_new_values
+        lag_columns[f"LogNew{field}"] = log_new_values
+        for prev_day in range(1, days_history_size + 1):
+            lag_columns[f"LogNew{field}_prev_day_{prev_day}"] = _shift_within_groups(
+                log_new_values, group_positions, prev_day
+            )
 
-            for prev_day in range(1, days_history_size + 1):
-                df.loc[
-                    location_df.index[prev_day:], f"LogNew{field}_prev_day_{prev_day}"
-                ] = log_new_values[:-prev_day]
-    return df
+    for location_name, field in sorted(dropped_locations):
+        print(f"{field} for {location_name} is not valid cumulative series, drop it")
+
+    lags_df = pd.DataFrame(lag_columns, index=df.index[order]).reindex(df.index)
+    df = pd.concat([df, lags_df], axis=1)
+    return df.loc[is_valid[location_ids]]
 
 
-def process_location(df: pd.DataFrame) -> pd.DataFrame:
+@instrumented("process_location")
+def process_location(
+    df: pd.DataFrame, days_history_size: int = DAYS_HISTORY_SIZE
+) -> pd.DataFrame:
     df = _preprocess_location(df)
-    df = _add_prev_day_columns(df)
-    df = _process_location_group(df)
+    df = _process_location_group(df, days_history_size=days_history_size)
     return df
 
 
 # ---------------------- Feature engineering ---------------------- #
 
 
-def process_area_df(area_df: pd.DataFrame) -> pd.DataFrame:
-    year_columns = [str(year) for year in range(1960, 2020)]
-    area_df["CountryArea"] = area_df[year_columns].apply(
-        lambda row: row[row.last_valid_index()] if row.last_valid_index() else np.nan,
-        axis="columns",
+@instrumented("build_country_features")
+def build_country_features(countries) -> pd.DataFrame:
+    countries = pd.Index(countries, name="Country/Region")
+
+    indicator_dfs = {
+        column: _index_by_country(
+            process_world_bank_indicator(load_df(), column, years)[
+                ["Country Name", column]
+            ],
+            "Country Name",
+        ).reindex(countries)
+        for column, load_df, years in world_bank_indicators
+    }
+
+    population_df = load_population_df(years=POPULATION_YEARS)
+    aggregated_population_df = _index_by_country(
+        process_population_df(population_df), "Location"
+    ).reindex(countries)
+
+    # The density needs the area, the other indicators are appended as they are
+    country_df = pd.concat(
+        [indicator_dfs.pop("CountryArea"), aggregated_population_df], axis="columns"
     )
-    return area_df[["Country Name", "CountryArea"]]
+    country_df = _add_country_population_density(country_df)
+    return pd.concat([country_df, *indicator_dfs.values()], axis="columns")
+
+
+def _index_by_country(df: pd.DataFrame, country_column: str) -> pd.DataFrame:
+    df = df.set_index(df.pop(country_column).astype(object))
+    return df.loc[~df.index.duplicated()]
 
 
+@instrumented("process_confirmed_case_and_fatality")
 def process_confirmed_case_and_fatality(
-    main_df: pd.DataFrame, thresholds: List[int] = [1, 10, 100]
+    main_df: pd.DataFrame,
+    thresholds: List[int] = days_since_thresholds,
+    origins: dict = distance_origins,
+    distance_method: str = DISTANCE_METHOD,
+    first_date=None,
 ):
-    first_date = min(main_df["Date"])
+    # `first_date` is the first date of the whole panel when given a part of it
+    if first_date is None:
+        first_date = min(main_df["Date"])
     main_df["Day"] = (main_df["Date"] - first_date).dt.days.astype("int32")
     main_df["WeekDay"] = main_df["Date"].transform(lambda d: d.weekday())
 
-    for threshold in thresholds:
-        main_df[f"Days_since_ConfirmedCases={threshold}"] = np.nan
-        main_df[f"Days_since_Fatalities={threshold}"] = np.nan
+    main_df = _add_days_since_features(main_df, thresholds)
 
-    for location_name, location_df in main_df.groupby(
-        ["Country/Region", "Province/State"]
-    ):
-        for field in ["ConfirmedCases", "Fatalities"]:
-            for threshold in thresholds:
-                first_day = (
-                    location_df["Day"].loc[location_df[field] >= threshold].min()
-                )
-                if not np.isnan(first_day):
-                    main_df.loc[
-                        location_df.index, f"Days_since_{field}={threshold}"
-                    ] = location_df["Day"].transform(
-                        lambda day: -1 if (day < first_day) else (day - first_day)
-                    )
-
-    origin_coords = get_hubei_coords(main_df)
-    main_df["Distance_to_origin"] = main_df.apply(
-        lambda row: geopy.distance.distance(
-            (row["Lat"], row["Long"]), origin_coords
-        ).km,
-        axis="columns",
-    )
+    main_df = add_distance_features(main_df, origins, method=distance_method)
 
-    world_bank_converters = {
-        "Country Name": remap_country_name_from_world_bank_to_df_name
-    }
-    un_wpp_converters = {"Location": remap_country_name_from_un_wpp_to_df_name}
+    return main_df
 
-    return main_df, world_bank_converters, un_wpp_converters
 
+def _add_days_since_features(
+    main_df: pd.DataFrame,
+    thresholds: List[int],
+    location_columns: List[str] = ["Country/Region", "Province/State"],
+) -> pd.DataFrame:
+    grouped = main_df.groupby(location_columns, sort=False)
+    location_ids = grouped.ngroup().to_numpy()
+    day = main_df["Day"].to_numpy()[:, None]
+    thresholds = np.asarray(thresholds)
+
+    days_since = {}
+    for field in ["ConfirmedCases", "Fatalities"]:
+        # First day per location on which each threshold is reached, all at once
+        reached = main_df[field].to_numpy()[:, None] >= thresholds
+        first_days = np.full((grouped.ngroups, len(thresholds)), np.inf)
+        np.minimum.at(first_days, location_ids, np.where(reached, day, np.inf))
+        first_days = first_days[location_ids]
+
+        days_since[field] = np.where(
+            np.isinf(first_days),
+            np.nan,
+            np.where(day < first_days, -1, day - first_days),
+        )
 
-def process_population_df(population_df: pd.DataFrame) -> pd.DataFrame:
-    population_df = population_df.loc[
-        (population_df["Time"] >= pd.Timestamp(2014, 1, 1))
-        & (population_df["Time"] <= pd.Timestamp(2019, 1, 1))
-    ]
+    for i, threshold in enumerate(thresholds):
+        for field in ["ConfirmedCases", "Fatalities"]:
+            main_df[f"Days_since_{field}={threshold}"] = days_since[field][:, i]
+    return main_df
 
-    aggregated_population_df = pd.DataFrame()
-    for (location, time), group_df in population_df.groupby(["Location", "Time"]):
-        pop_by_age_groups = [0] * 5
-        pop_male = 0
-        pop_female = 0
 
-        for _, row in group_df.iterrows():
-            age_grp_start = int(re.split(r"[\-\+]", row["AgeGrp"])[0])
-            pop_by_age_groups[min(age_grp_start // 20, 4)] += (
-                row["PopMale"] + row["PopFemale"]
-            )
-            pop_male += row["PopMale"]
-            pop_female += row["PopFemale"]
-
-        aggregated_population_df = pd.concat(
-            [
-                aggregated_population_df,
-                pd.DataFrame(
-                    [
-                        {
-                            "Location": location,
-                            "Time": time,
-                            "CountryPop_0-20": pop_by_age_groups[0],
-                            "CountryPop_20-40": pop_by_age_groups[1],
-                            "CountryPop_40-60": pop_by_age_groups[2],
-                            "CountryPop_60-80": pop_by_age_groups[3],
-                            "CountryPop_80+": pop_by_age_groups[4],
-                            "CountryPopMale": pop_male,
-                            "CountryPopFemale": pop_female,
-                            "CountryPopTotal": pop_male + pop_female,
-                        }
-                    ]
-                ),
-            ],
-            ignore_index=True,
-        )
+def process_population_df(
+    population_df: pd.DataFrame, years=POPULATION_YEARS
+) -> pd.DataFrame:
+    population_df = population_df.loc[population_df["Time"].between(*years)]
+
+    # Parse each distinct AgeGrp code ("0-4", ..., "100+") once
+    age_groups = population_df["AgeGrp"].astype("category")
+    age_group_starts = (
+        age_groups.cat.categories.str.split(r"[\-\+]", regex=True).str[0].astype(int)
+    )
+    age_buckets = np.minimum(age_group_starts.to_numpy() // 20, 4)
+    age_bucket = age_buckets[age_groups.cat.codes.to_numpy()]
+
+    group_keys = [population_df["Location"], population_df["Time"]]
+    pop_by_age_groups = (
+        (population_df["PopMale"] + population_df["PopFemale"])
+        .groupby(group_keys + [age_bucket], observed=True)
+        .sum()
+        .unstack(fill_value=0)
+        .reindex(columns=range(5), fill_value=0)
+    )
+    pop_by_age_groups.columns = [
+        "CountryPop_0-20",
+        "CountryPop_20-40",
+        "CountryPop_40-60",
+        "CountryPop_60-80",
+        "CountryPop_80+",
+    ]
+    pop_by_sex = (
+        population_df[["PopMale", "PopFemale"]]
+        .groupby(group_keys, observed=True)
+        .sum()
+        .rename(columns={"PopMale": "CountryPopMale", "PopFemale": "CountryPopFemale"})
+    )
+
+    aggregated_population_df = pop_by_age_groups.join(pop_by_sex)
+    aggregated_population_df["CountryPopTotal"] = (
+        aggregated_population_df["CountryPopMale"]
+        + aggregated_population_df["CountryPopFemale"]
+    )
+    aggregated_population_df = aggregated_population_df.reset_index(
+        names=["Location", "Time"]
+    )
 
     aggregated_population_df = aggregated_population_df.sort_values(
         "Time"
@@ -226,23 +480,26 @@ def _add_country_population_density(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def process_smoking_df(smoking_df: pd.DataFrame) -> pd.DataFrame:
-    recent_year_columns = [str(year) for year in range(2010, 2020)]
-    smoking_df["CountrySmokingRate"] = smoking_df[recent_year_columns].apply(
-        lambda row: row[row.last_valid_index()] if row.last_valid_index() else np.nan,
-        axis="columns",
+def process_world_bank_indicator(
+    indicator_df: pd.DataFrame, value_column: str, years=(1960, 2019)
+) -> pd.DataFrame:
+    year_columns = [str(year) for year in range(years[0], years[1] + 1)]
+    values = indicator_df[year_columns].to_numpy()
+
+    # Forward-fill the column index of valid values along the year axis, the
+    # last column then points at the latest valid year of each country
+    valid_positions = np.where(~np.isnan(values), np.arange(len(year_columns)), -1)
+    latest_positions = np.maximum.accumulate(valid_positions, axis=1)[:, -1]
+    has_value = latest_positions >= 0
+    rows = np.arange(len(values))
+
+    result_df = indicator_df[["Country Name"]].copy()
+    result_df[value_column] = np.where(
+        has_value, values[rows, latest_positions], np.nan
+    ).astype(values.dtype)
+    result_df[f"{value_column}Year"] = (
+        pd.Series(years[0] + latest_positions, index=result_df.index)
+        .where(has_value)
+        .astype("Int16")
     )
-    return smoking_df[["Country Name", "CountrySmokingRate"]]
-
-
-def process_health_expenditure_df(health_expenditure_df: pd.DataFrame) -> pd.DataFrame:
-    recent_year_columns = [str(year) for year in range(2010, 2020)]
-    health_expenditure_df[
-        "CountryHealthExpenditurePerCapitaPPP"
-    ] = health_expenditure_df[recent_year_columns].apply(
-        lambda row: row[row.last_valid_index()] if row.last_valid_index() else np.nan,
-        axis="columns",
-    )
-    return health_expenditure_df[
-        ["Country Name", "CountryHealthExpenditurePerCapitaPPP"]
-    ]
+    return result_df
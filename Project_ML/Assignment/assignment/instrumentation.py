@@ -0,0 +1,173 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from assignment.config import (
+    PROFILES_DIR,
+    PROFILE_STAGES_ENV_VAR,
+    PROFILE_MODE_ENV_VAR,
+)
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+profile_modes = ["cprofile", "tracemalloc"]
+
+_run = {"started_at": None, "stages": [], "stack": []}
+_profiling = {"stages": None, "mode": None, "active": False}
+
+
+def start_run():
+    _run["started_at"] = datetime.now().isoformat(timespec="seconds")
+    _run["stages"] = []
+    _run["stack"] = []
+
+
+def enable_profiling(stages=None, mode=None):
+    # Stages and mode fall back to the environment, e.g.
+    # ASSIGNMENT_PROFILE_STAGES=process_data,train ASSIGNMENT_PROFILE_MODE=tracemalloc
+    if stages is None:
+        stages = [s for s in os.environ.get(PROFILE_STAGES_ENV_VAR, "").split(",") if s]
+    mode = mode or os.environ.get(PROFILE_MODE_ENV_VAR) or "cprofile"
+    if mode not in profile_modes:
+        raise ValueError(
+            f"Unknown profile mode {mode}, expected one of {profile_modes}"
+        )
+    _profiling["stages"] = set(stages)
+    _profiling["mode"] = mode
+
+
+def add_instrumentation_arguments(parser):
+    parser.add_argument(
+        "--profile-stage",
+        action="append",
+        default=None,
+        metavar="STAGE",
+        help=f"dump a profile of the named stage to {PROFILES_DIR} (repeatable)",
+    )
+    parser.add_argument("--profile-mode", choices=profile_modes, default=None)
+
+
+@contextmanager
+def stage(name: str):
+    # Records wall time, CPU time and peak RSS growth of the enclosed block, the
+    # yielded record can be given the produced frame with `record_frame`
+    record = {
+        "name": name,
+        "parent": _run["stack"][-1]["name"] if _run["stack"] else None,
+    }
+    _run["stack"].append(record)
+
+    profiler = _start_profiler(name)
+    peak_rss_before = peak_rss_mb()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = round(time.perf_counter() - wall_start, 4)
+        record["cpu_s"] = round(time.process_time() - cpu_start, 4)
+        if peak_rss_before is not None:
+            record["peak_rss_delta_mb"] = round(peak_rss_mb() - peak_rss_before, 1)
+        if profiler is not None:
+            record["profile"] = _stop_profiler(name, profiler)
+
+        _run["stack"].pop()
+        _run["stages"].append(record)
+
+
+def instrumented(name: str):
+    # Decorator form of `stage`, records the shape of a returned DataFrame
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                result = function(*args, **kwargs)
+                record_frame(record, result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def record_frame(record: dict, df):
+    # pandas is imported here so that the CLI can import this module cheaply
+    import pandas as pd
+
+    if isinstance(df, pd.DataFrame):
+        record["rows"], record["columns"] = df.shape
+
+
+def write_run_report(directory: str, name: str) -> str:
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(directory, f"run_report_{name}_{stamp}.json")
+    report = {
+        "name": name,
+        "started_at": _run["started_at"],
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "argv": sys.argv,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": _run["stages"],
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Run report saved to {path}")
+    return path
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10
+
+
+def _start_profiler(name: str):
+    if _profiling["stages"] is None:
+        enable_profiling()
+    # A stage nested in a profiled stage is already covered by its profile
+    if name not in _profiling["stages"] or _profiling["active"]:
+        return None
+    _profiling["active"] = True
+
+    if _profiling["mode"] == "tracemalloc":
+        tracemalloc.start()
+        return tracemalloc
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(name: str, profiler) -> str:
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    if profiler is tracemalloc:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        path = os.path.join(PROFILES_DIR, f"{name}_{stamp}.tracemalloc.txt")
+        with open(path, "w") as f:
+            f.write(f"Peak traced memory: {peak / 2**20:.1f} MB\n")
+            for statistic in snapshot.statistics("lineno")[:50]:
+                f.write(f"{statistic}\n")
+    else:
+        profiler.disable()
+        path = os.path.join(PROFILES_DIR, f"{name}_{stamp}.prof")
+        profiler.dump_stats(path)
+
+    _profiling["active"] = False
+    print(f"Profile of {name} saved to {path}")
+    return path
@@ -2,13 +2,21 @@ import matplotlib.pyplot as plt
 import matplotlib
 import pandas as pd
 
-from assignment.config import (
-    LAST_TRAIN_DATE,
-    LAST_EVAL_DATE,
-)
+from assignment import config
+from assignment.config import location_columns
 
 from assignment.utils import load_latest_predictions
 
+default_locations = [("US", "Kansas"), ("China", "Hubei")]
+# Columns read from the predictions
+plot_columns = location_columns + [
+    "Date",
+    "ConfirmedCases",
+    "Fatalities",
+    "PredictedConfirmedCases",
+    "PredictedFatalities",
+]
+
 
 def plot_graph(main_df, country_region, province_state, field, log_scale=True):
     location_df = main_df.loc[
@@ -36,25 +44,36 @@ def plot_graph(main_df, country_region, province_state, field, log_scale=True):
         ax.transData, ax.transAxes
     )
 
-    first_eval_date = LAST_TRAIN_DATE + pd.Timedelta(days=1)
-    first_test_date = LAST_EVAL_DATE + pd.Timedelta(days=1)
+    first_eval_date = config.LAST_TRAIN_DATE + pd.Timedelta(days=1)
+    first_test_date = config.LAST_EVAL_DATE + pd.Timedelta(days=1)
 
-    plt.axvline(x=LAST_TRAIN_DATE, color="#000000")
+    plt.axvline(x=config.LAST_TRAIN_DATE, color="#000000")
     plt.text(first_eval_date, 0.95, "eval", transform=transform_for_text)
-    plt.axvline(x=LAST_EVAL_DATE, color="#000000")
+    plt.axvline(x=config.LAST_EVAL_DATE, color="#000000")
     plt.text(first_test_date, 0.95, "test", transform=transform_for_text)
 
     plt.legend()
     plt.show()
 
 
-def cli_entrypoint():
+def cli_entrypoint(argv=None):
+    # Kept for the existing `plot` script, the parser lives in `assignment.cli`
+    from assignment.cli import plot
+
+    return plot(argv)
+
+
+def run(args):
+    main_df = load_latest_predictions(columns=plot_columns)
+    # Locations without a province are stored as NaN
+    main_df["Province/State"] = main_df["Province/State"].astype(object).fillna("")
 
-    main_df = load_latest_predictions()
-    main_df["Date"] = pd.to_datetime(main_df["Date"])
-    plot_graph(main_df, "US", "Kansas", "ConfirmedCases")
-    plot_graph(main_df, "US", "Kansas", "Fatalities")
-    plot_graph(main_df, "China", "Hubei", "ConfirmedCases")
-    plot_graph(main_df, "China", "Hubei", "Fatalities")
-    # plot_graph(main_df, "Germany", '', "ConfirmedCases", log_scale=False)
-    # plot_graph(main_df, "Germany", '', "Fatalities", log_scale=False)
+    for country_region, *province_state in args.location or default_locations:
+        for field in ["ConfirmedCases", "Fatalities"]:
+            plot_graph(
+                main_df,
+                country_region,
+                province_state[0] if province_state else "",
+                field,
+                log_scale=not args.linear,
+            )
@@ -0,0 +1,94 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+import catboost as cb
+
+from assignment import config
+from assignment.config import cat_features, targets
+from assignment.utils import feature_schema_hash
+
+
+@contextmanager
+def training_pools(training_data, cache_key: str = None):
+    # Yields {target: (train pool path, eval pool path)} of quantized pools,
+    # cached in FEATURE_STORE_DIR/pools_<hash> when `cache_key` is given and
+    # in a temporary directory for the block otherwise
+    if cache_key is None:
+        with tempfile.TemporaryDirectory() as directory:
+            yield _save_pools(training_data, directory)
+        return
+
+    train_features_df = training_data[0]
+    key = hashlib.sha256(
+        json.dumps([cache_key, feature_schema_hash(train_features_df.columns)]).encode()
+    ).hexdigest()[:16]
+    directory = os.path.join(config.FEATURE_STORE_DIR, f"pools_{key}")
+    if os.path.exists(directory):
+        print(f"Using quantized pools: {directory}")
+        yield _pool_paths(directory)
+        return
+
+    tmp_directory = directory + ".tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    _save_pools(training_data, tmp_directory)
+    os.replace(tmp_directory, directory)
+
+    # Pools of older features can never be used again
+    for stale_directory in glob.glob(os.path.join(config.FEATURE_STORE_DIR, "pools_*")):
+        if stale_directory != directory:
+            shutil.rmtree(stale_directory, ignore_errors=True)
+    print(f"Quantized pools saved to {directory}")
+    yield _pool_paths(directory)
+
+
+def memory_pools(training_data) -> dict:
+    # Same layout as training_pools for pools used once in this process. They
+    # are not quantized up front: CatBoost bundles sparse features only when it
+    # quantizes in memory, so these train exactly like the frames
+    train_features_df, train_labels, eval_features_df, eval_labels = training_data
+    return {
+        target: (
+            cb.Pool(train_features_df, train_labels[target], cat_features=cat_features),
+            cb.Pool(eval_features_df, eval_labels[target], cat_features=cat_features),
+        )
+        for target in targets
+    }
+
+
+def as_pool(pool):
+    return cb.Pool("quantized://" + pool) if isinstance(pool, str) else pool
+
+
+def _save_pools(training_data, directory: str) -> dict:
+    # One pool per split and target, as a quantized pool holds a single label;
+    # all of them share the borders computed on the first training pool
+    train_features_df, train_labels, eval_features_df, eval_labels = training_data
+    borders_path = os.path.join(directory, "borders.tsv")
+    for target in targets:
+        for split, features_df, labels in [
+            ("train", train_features_df, train_labels),
+            ("eval", eval_features_df, eval_labels),
+        ]:
+            pool = cb.Pool(features_df, labels[target], cat_features=cat_features)
+            if os.path.exists(borders_path):
+                pool.quantize(input_borders=borders_path)
+            else:
+                pool.quantize()
+                pool.save_quantization_borders(borders_path)
+            pool.save(os.path.join(directory, f"{split}_{target}.bin"))
+    return _pool_paths(directory)
+
+
+def _pool_paths(directory: str) -> dict:
+    return {
+        target: tuple(
+            os.path.join(directory, f"{split}_{target}.bin")
+            for split in ["train", "eval"]
+        )
+        for target in targets
+    }
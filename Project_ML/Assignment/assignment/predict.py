@@ -4,122 +4,209 @@ import catboost as cb
 import os
 from datetime import datetime
 
+from assignment import config
 from assignment.config import (
     cat_features,
     location_columns,
-    LAST_TRAIN_DATE,
-    LAST_EVAL_DATE,
-    LAST_TEST_DATE,
-    PREDICTIONS_DIR,
+    prediction_columns,
+)
+from assignment.instrumentation import (
+    enable_profiling,
+    record_frame,
+    stage,
+    start_run,
+    write_run_report,
+)
+from assignment.utils import (
+    is_pyarrow_available,
+    load_latest_models,
+    print_memory_usage,
 )
-from assignment.utils import load_latest_models
-from assignment.data_load import load_data
 from assignment.train import preprocess_df, split_dfs
-from assignment.features import process_data
+from assignment.feature_store import load_processed_data
 
 
-def _save_predictions(train_df, eval_df, test_df):
-    os.makedirs(PREDICTIONS_DIR, exist_ok=True)  # Create folder if it doesn't exist
+def _save_predictions(train_df, eval_df, test_df, csv: bool = False):
+    # Create folder if it doesn't exist
+    os.makedirs(config.PREDICTIONS_DIR, exist_ok=True)
     stamp = datetime.now().strftime("%Y%m%d")
-    final_df = pd.concat([train_df, eval_df, test_df])
-    path = os.path.join(PREDICTIONS_DIR, f"predictions_{stamp}.csv")
-    final_df.to_csv(path, index=False)
-
-    print(f"Predictions saved to {path}")
+    # Only the identifying, actual and predicted columns, not the lag features
+    final_df = pd.concat(
+        [df.reindex(columns=prediction_columns) for df in [train_df, eval_df, test_df]],
+        ignore_index=True,
+    )
+    path = os.path.join(config.PREDICTIONS_DIR, f"predictions_{stamp}")
+
+    if is_pyarrow_available():
+        final_df.to_parquet(path + ".parquet", index=False)
+        print(f"Predictions saved to {path}.parquet")
+    elif not csv:
+        print("pyarrow is not installed, saving the predictions as CSV.")
+        csv = True
+    if csv:
+        final_df.to_csv(path + ".csv", index=False)
+        print(f"Predictions saved to {path}.csv")
+
+
+def _to_panel_positions(df, first_date, last_date):
+    days = pd.date_range(first_date, last_date)
+    day_ids = (df["Date"] - first_date).dt.days.to_numpy()
+    in_range = np.flatnonzero((day_ids >= 0) & (day_ids < len(days)))
+
+    location_ids, locations = pd.MultiIndex.from_frame(
+        df[location_columns].iloc[in_range]
+    ).factorize()
+
+    row_positions = np.full((len(days), len(locations)), -1)
+    row_positions[day_ids[in_range], location_ids] = in_range
+    if (row_positions < 0).any():
+        raise ValueError(
+            f"Every location needs a row for each day in {first_date} - {last_date}"
+        )
+    return row_positions, locations
 
 
 def _predict_for_dataset(
     df, features_df, prev_day_df, first_date, last_date, update_features_data, models
 ):
-    df["PredictedLogNewConfirmedCases"] = np.nan
-    df["PredictedLogNewFatalities"] = np.nan
-    df["PredictedConfirmedCases"] = np.nan
-    df["PredictedFatalities"] = np.nan
+    # Forecast on a dense (day, location, feature) array, so each day is one
+    # predict call per target and feeding predictions back is array slicing
+    row_positions, locations = _to_panel_positions(df, first_date, last_date)
+    n_days = row_positions.shape[0]
+
+    features_df = features_df.loc[df.index]
+    feature_columns = list(features_df.columns)
+    numeric_columns = [c for c in feature_columns if c not in cat_features]
+    # CatBoost reads float features as float32, so the panel is kept in float32
+    features = features_df[numeric_columns].to_numpy(dtype=np.float32)[row_positions]
+    # Categorical columns are encoded once, so each daily Pool only wraps a
+    # slice of the panel; CatBoost matches the features by name
+    cat_feature_data = np.column_stack(
+        [
+            features_df[c].astype(str).str.encode("utf-8").to_numpy()[row_positions[0]]
+            for c in cat_features
+        ]
+    )
+
+    prediction_types = ["LogNewConfirmedCases", "LogNewFatalities"]
+    lag_columns = {
+        t: [
+            numeric_columns.index(f"{t}_prev_day_{k}")
+            for k in range(1, n_days)
+            if f"{t}_prev_day_{k}" in numeric_columns
+        ]
+        for t in prediction_types
+    }
+    predictions = {t: np.empty(row_positions.shape) for t in prediction_types}
 
-    for day in pd.date_range(first_date, last_date):
-        day_df = df[df["Date"] == day]
+    for day_idx in range(n_days):
         day_features_pool = cb.Pool(
-            features_df.loc[day_df.index], cat_features=cat_features
+            cb.FeaturesData(
+                num_feature_data=features[day_idx],
+                cat_feature_data=cat_feature_data,
+                num_feature_names=numeric_columns,
+                cat_feature_names=cat_features,
+            )
         )
 
-        for prediction_type in ["LogNewConfirmedCases", "LogNewFatalities"]:
-            df.loc[day_df.index, "Predicted" + prediction_type] = np.maximum(
+        for prediction_type in prediction_types:
+            day_predictions = np.maximum(
                 models[prediction_type].predict(day_features_pool), 0.0
             )
+            predictions[prediction_type][day_idx] = day_predictions
+
+            if update_features_data:
+                # Prediction for `day` becomes lag `k` of `day + k`
+                lags = lag_columns[prediction_type][: n_days - day_idx - 1]
+                next_days = np.arange(day_idx + 1, day_idx + 1 + len(lags))
+                features[next_days, :, lags] = day_predictions
+
+    outputs = {"Predicted" + t: predictions[t] for t in prediction_types}
+    outputs.update(_reconstruct_cumulative(predictions, prev_day_df, locations))
+
+    # Panel cells map to row positions of `df`, rows outside the panel stay NaN
+    positions = row_positions.ravel()
+    for column, values in outputs.items():
+        column_values = np.full(len(df), np.nan)
+        column_values[positions] = values.ravel()
+        df[column] = column_values
+
+
+def _reconstruct_cumulative(predictions, prev_day_df, locations):
+    # Cumulative counts for all locations and days in one cumsum over a
+    # (field, day, location) array that starts from the last known counts
+    fields = ["ConfirmedCases", "Fatalities"]
+    prev_day_values = (
+        prev_day_df.set_index(location_columns)[fields].reindex(locations).to_numpy().T
+    )
+    new_values = np.rint(np.expm1([predictions["LogNew" + f] for f in fields]))
+    cumulative_values = np.cumsum(
+        np.concatenate([prev_day_values[:, np.newaxis], new_values], axis=1), axis=1
+    )
+    return {"Predicted" + f: cumulative_values[i, 1:] for i, f in enumerate(fields)}
 
-        day_predictions_df = df.loc[day_df.index][
-            location_columns
-            + ["PredictedLogNewConfirmedCases", "PredictedLogNewFatalities"]
-        ]
-
-        for field in ["ConfirmedCases", "Fatalities"]:
-            prev_day_field = field if day == first_date else ("Predicted" + field)
-            merged_df = day_predictions_df.merge(
-                right=prev_day_df[location_columns + [prev_day_field]],
-                how="inner",
-                on=location_columns,
-            )
-
-            df.loc[day_df.index, "Predicted" + field] = merged_df.apply(
-                lambda row: row[prev_day_field]
-                + np.rint(np.expm1(row["PredictedLogNew" + field])),
-                axis="columns",
-            ).values
 
-        if update_features_data:
-            for next_day in pd.date_range(day + pd.Timedelta(days=1), last_date):
-                next_day_features_df = features_df[df["Date"] == next_day]
-                merged_df = next_day_features_df[location_columns].merge(
-                    right=day_predictions_df, how="inner", on=location_columns
-                )
+def cli_entrypoint(argv=None):
+    # Kept for the existing `predict` script, the parser lives in `assignment.cli`
+    from assignment.cli import predict
 
-                prev_day_idx = (next_day - day).days
-                for prediction_type in ["LogNewConfirmedCases", "LogNewFatalities"]:
-                    features_df.loc[
-                        next_day_features_df.index,
-                        prediction_type + "_prev_day_%s" % prev_day_idx,
-                    ] = merged_df["Predicted" + prediction_type].values
+    return predict(argv)
 
-        prev_day_df = df.loc[day_df.index]
 
+def run(args):
+    start_run()
+    enable_profiling(args.profile_stage, args.profile_mode)
 
-def cli_entrypoint():
     models = load_latest_models()
     if not models:
         raise RuntimeError(
             "No trained models found. Please run `poetry run train` first."
         )
 
-    main_df = load_data()
+    processed_df = load_processed_data(
+        compact=args.compact, memory_profile=args.memory_profile, jobs=args.jobs
+    )
+    train_df, eval_df, test_df = run_predictions(
+        models, processed_df, compact=args.compact
+    )
+    with stage("save_predictions"):
+        _save_predictions(train_df, eval_df, test_df, csv=args.csv)
+    if args.memory_profile:
+        print_memory_usage()
+    write_run_report(config.PREDICTIONS_DIR, "predict")
+
 
-    train_df, eval_df, test_df = split_dfs(main_df)
-    processed_df = process_data(main_df)
-    train_df, eval_df, test_df = split_dfs(processed_df)
+def run_predictions(models, processed_df, compact: bool = False):
+    train_df, eval_df, test_df = split_dfs(processed_df, copy=not compact)
     eval_features_df, _ = preprocess_df(eval_df)
     test_features_df, _ = preprocess_df(test_df)
 
-    first_eval_date = LAST_TRAIN_DATE + pd.Timedelta(days=1)
-    first_test_date = LAST_EVAL_DATE + pd.Timedelta(days=1)
-
-    prev_day_df = train_df.loc[train_df["Date"] == LAST_TRAIN_DATE]
-    _predict_for_dataset(
-        eval_df,
-        eval_features_df,
-        prev_day_df,
-        first_eval_date,
-        LAST_EVAL_DATE,
-        update_features_data=False,
-        models=models,
-    )
-
-    prev_day_df = eval_df.loc[eval_df["Date"] == LAST_EVAL_DATE]
-    _predict_for_dataset(
-        test_df,
-        test_features_df,
-        prev_day_df,
-        first_test_date,
-        LAST_TEST_DATE,
-        update_features_data=True,
-        models=models,
-    )
-    _save_predictions(train_df, eval_df, test_df)
+    first_eval_date = config.LAST_TRAIN_DATE + pd.Timedelta(days=1)
+    first_test_date = config.LAST_EVAL_DATE + pd.Timedelta(days=1)
+
+    with stage("predict_eval") as record:
+        prev_day_df = train_df.loc[train_df["Date"] == config.LAST_TRAIN_DATE]
+        _predict_for_dataset(
+            eval_df,
+            eval_features_df,
+            prev_day_df,
+            first_eval_date,
+            config.LAST_EVAL_DATE,
+            update_features_data=False,
+            models=models,
+        )
+        record_frame(record, eval_df)
+
+    with stage("predict_test") as record:
+        prev_day_df = eval_df.loc[eval_df["Date"] == config.LAST_EVAL_DATE]
+        _predict_for_dataset(
+            test_df,
+            test_features_df,
+            prev_day_df,
+            first_test_date,
+            config.LAST_TEST_DATE,
+            update_features_data=True,
+            models=models,
+        )
+        record_frame(record, test_df)
+    return train_df, eval_df, test_df
@@ -0,0 +1,134 @@
+import copy
+import glob
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+
+from assignment import config
+
+_manifest_cache = {"stat": None, "manifest": None}
+
+
+def register_model(model, target: str, metrics: dict = None) -> dict:
+    os.makedirs(config.MODELS_DIR, exist_ok=True)
+    manifest = _edit_manifest()
+
+    # Several trainings a day must not overwrite each other
+    model_id = f"{target}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+    path = os.path.join(config.MODELS_DIR, f"covid_19_model_{model_id}.cbm")
+    model.save_model(path)
+
+    entry = {
+        "id": model_id,
+        "target": target,
+        "path": os.path.basename(path),
+        "feature_schema": model.get_metadata().get("feature_schema"),
+        "last_train_date": model.get_metadata().get("last_train_date"),
+        "metrics": metrics or {},
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    manifest["models"][model_id] = entry
+    manifest["latest"][target] = model_id
+    _write_manifest(manifest)
+
+    print(f"Saved: {path}")
+    return entry
+
+
+def pin_model(model_id: str):
+    manifest = _edit_manifest()
+    if model_id not in manifest["models"]:
+        raise KeyError(f"Model {model_id} is not registered in {_manifest_path()}")
+    manifest["pinned"][manifest["models"][model_id]["target"]] = model_id
+    _write_manifest(manifest)
+
+
+def unpin_model(target: str):
+    manifest = _edit_manifest()
+    manifest["pinned"].pop(target, None)
+    _write_manifest(manifest)
+
+
+def get_model_entry(target: str):
+    manifest = _read_manifest()
+    model_id = manifest["pinned"].get(target) or manifest["latest"].get(target)
+    return manifest["models"].get(model_id)
+
+
+def find_latest_model(target: str):
+    pattern = os.path.join(config.MODELS_DIR, f"covid_19_model_{target}_*.cbm")
+    files = glob.glob(pattern)
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def model_path(target: str):
+    # Path of the registered model of `target`, or of its newest model file when
+    # it is not registered (saved before the registry existed) or was deleted
+    entry = get_model_entry(target)
+    if entry:
+        path = os.path.join(config.MODELS_DIR, entry["path"])
+        if os.path.exists(path):
+            return path
+        print(f"Registered model {entry['id']} is missing: {path}")
+    return find_latest_model(target)
+
+
+def latest_model_paths(targets):
+    # Paths of the models `load_latest_models` would load, or None if a target
+    # has no model; cheap enough for the CLI to check before importing catboost
+    paths = {}
+    for target in targets:
+        path = model_path(target)
+        if not path:
+            return None
+        paths[target] = path
+    return paths
+
+
+def load_model(target: str):
+    path = model_path(target)
+    if path is None:
+        return None
+    return load_model_file(path)
+
+
+@lru_cache(maxsize=16)
+def load_model_file(path: str):
+    # Registered model files are never rewritten, so caching by path is safe
+    import catboost as cb
+
+    model = cb.CatBoostRegressor()
+    model.load_model(path)
+    return model
+
+
+def _manifest_path() -> str:
+    return os.path.join(config.MODELS_DIR, "manifest.json")
+
+
+def _read_manifest() -> dict:
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return {"models": {}, "latest": {}, "pinned": {}}
+
+    # Re-read only when another process (or a write here) changed the file
+    stat = os.stat(path)
+    if _manifest_cache["stat"] != (path, stat.st_mtime_ns, stat.st_size):
+        with open(path) as f:
+            _manifest_cache["manifest"] = json.load(f)
+        _manifest_cache["stat"] = (path, stat.st_mtime_ns, stat.st_size)
+    return _manifest_cache["manifest"]
+
+
+def _edit_manifest() -> dict:
+    # A copy, so that a failed write does not leave the cached manifest changed
+    return copy.deepcopy(_read_manifest())
+
+
+def _write_manifest(manifest: dict):
+    path = _manifest_path()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,135 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+
+from assignment.config import location_columns
+from assignment.utils import load_latest_models
+from assignment.feature_store import load_processed_data
+from assignment.instrumentation import start_run
+from assignment.predict import run_predictions
+
+forecast_columns = [
+    "Date",
+    "ConfirmedCases",
+    "Fatalities",
+    "PredictedConfirmedCases",
+    "PredictedFatalities",
+]
+
+
+class ForecastService:
+    def __init__(self, processed_df: pd.DataFrame = None):
+        self._lock = threading.Lock()
+        # Reloads take a while, one at a time while requests keep being answered
+        self._reload_lock = threading.Lock()
+        self.processed_df = (
+            processed_df if processed_df is not None else load_processed_data()
+        )
+        self.reload()
+
+    def reload(self):
+        with self._reload_lock:
+            # The stages of a reload are recorded from scratch, the server runs
+            # for long and would otherwise keep every reload's stages
+            start_run()
+            models = load_latest_models()
+            if not models:
+                raise RuntimeError(
+                    "No trained models found. Please run `poetry run train` first."
+                )
+
+            # Forecast every location once, requests are then answered by lookup
+            _, eval_df, test_df = run_predictions(models, self.processed_df)
+            forecast_df = pd.concat([eval_df, test_df])[
+                location_columns + forecast_columns
+            ]
+            forecasts = {
+                location: location_df.set_index("Date")[forecast_columns[1:]]
+                for location, location_df in forecast_df.groupby(location_columns)
+            }
+
+            with self._lock:
+                self._forecasts = forecasts
+        print(f"Forecasts ready for {len(forecasts)} locations")
+
+    def forecast(self, country_region, province_state, first_date, last_date):
+        with self._lock:
+            location_df = self._forecasts.get((country_region, province_state))
+        if location_df is None:
+            raise KeyError(f"Unknown location {country_region} {province_state}")
+
+        location_df = location_df.loc[first_date:last_date]
+        location_df = location_df.astype(object).where(location_df.notna(), None)
+        return [
+            {"Date": str(date.date()), **values}
+            for date, values in zip(
+                location_df.index, location_df.to_dict(orient="records")
+            )
+        ]
+
+
+def make_server(service: ForecastService, host: str = "127.0.0.1", port: int = 8000):
+    class ForecastRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                return self._send_json(200, {"status": "ok"})
+            if url.path != "/forecast":
+                return self._send_json(404, {"error": f"Unknown path {url.path}"})
+
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                first_date = pd.Timestamp(query["start"])
+                last_date = pd.Timestamp(query.get("end", query["start"]))
+            except (KeyError, ValueError) as e:
+                return self._send_json(400, {"error": f"Invalid dates: {e}"})
+
+            try:
+                forecast = service.forecast(
+                    query.get("country", ""),
+                    query.get("province", ""),
+                    first_date,
+                    last_date,
+                )
+            except KeyError as e:
+                return self._send_json(404, {"error": e.args[0]})
+            self._send_json(200, {"forecast": forecast})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/reload":
+                return self._send_json(404, {"error": f"Unknown path {self.path}"})
+            try:
+                service.reload()
+            except Exception as e:
+                # The previous forecasts are still served
+                return self._send_json(500, {"error": f"Reload failed: {e}"})
+            self._send_json(200, {"status": "reloaded"})
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ThreadingHTTPServer((host, port), ForecastRequestHandler)
+
+
+def cli_entrypoint(argv=None):
+    parser = argparse.ArgumentParser(description="Serve COVID-19 forecasts.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    server = make_server(ForecastService(), args.host, args.port)
+    print(f"Serving forecasts on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,32 +1,88 @@
 import glob
+import io
 import os
-from re import split
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import catboost as cb
-from datetime import datetime
 
+from assignment import config
 from assignment.config import (
-    MODELS_DIR,
     cat_features,
     targets,
-    LAST_TRAIN_DATE,
-    LAST_EVAL_DATE,
 )
-from assignment.utils import load_latest_models
-from assignment.data_load import load_data
-from assignment.features import process_data
+from assignment.utils import (
+    load_latest_models,
+    feature_schema_hash,
+    print_memory_usage,
+)
+from assignment.registry import register_model
+from assignment.pools import as_pool, training_pools
+from assignment.feature_store import (
+    feature_store_key,
+    iter_feature_dataset_days,
+    load_processed_data,
+    load_processed_dataset,
+)
+from assignment.instrumentation import (
+    enable_profiling,
+    instrumented,
+    start_run,
+    write_run_report,
+)
+
 
+def cli_entrypoint(argv=None):
+    # Kept for the existing `train` script, the parser lives in `assignment.cli`
+    from assignment.cli import train
+
+    return train(argv)
+
+
+def run(args):
+    start_run()
+    enable_profiling(args.profile_stage, args.profile_mode)
 
-def cli_entrypoint():
     models = load_latest_models()
-    if models:
+    if models and not args.warm_start:
         print("Using existing models, skipping training.")
         return models
 
-    main_df = load_data()
-    processed_df = process_data(main_df)
-    models = _train(processed_df, iterations=1000)
+    if args.streaming:
+        dataset_directory = load_processed_dataset(chunk_locations=args.chunk_locations)
+        models = _train_from_dataset(dataset_directory, iterations=1000)
+        _save_models(models)
+        if args.memory_profile:
+            print_memory_usage()
+        write_run_report(config.MODELS_DIR, "train")
+        return models
+
+    processed_df = load_processed_data(
+        compact=args.compact, memory_profile=args.memory_profile, jobs=args.jobs
+    )
+    if models:
+        updated_models = _warm_start_train(
+            processed_df,
+            models,
+            iterations=args.warm_start_iterations,
+            compact=args.compact,
+        )
+        if updated_models is not None:
+            _save_models(updated_models)
+            write_run_report(config.MODELS_DIR, "train")
+            return {**models, **updated_models}
+
+    models = _train(
+        processed_df,
+        iterations=1000,
+        workers=args.train_workers,
+        compact=args.compact,
+        pool_cache_key=feature_store_key(),
+    )
     _save_models(models)
+    if args.memory_profile:
+        print_memory_usage()
+    write_run_report(config.MODELS_DIR, "train")
     return models
 
 
@@ -42,49 +98,262 @@ def preprocess_df(df: pd.DataFrame):
             "LogNewFatalities",
             "Date",
         ]
-    ).copy()
+    )
     return features_df, labels
 
 
-def split_dfs(main_df: pd.DataFrame):
-    train_df = main_df[main_df["Date"] <= LAST_TRAIN_DATE].copy()
+def split_dfs(main_df: pd.DataFrame, copy: bool = True):
+    if not copy and main_df["Date"].is_monotonic_increasing:
+        # Rows are sorted by date, so each split is a contiguous slice
+        first_eval, first_test = main_df["Date"].searchsorted(
+            [config.LAST_TRAIN_DATE, config.LAST_EVAL_DATE], side="right"
+        )
+        # Shallow copies share the data but keep added columns out of `main_df`
+        return tuple(
+            main_df.iloc[split].copy(deep=False)
+            for split in [
+                slice(None, first_eval),
+                slice(first_eval, first_test),
+                slice(first_test, None),
+            ]
+        )
+
+    train_df = main_df[main_df["Date"] <= config.LAST_TRAIN_DATE].copy()
     eval_df = main_df[
-        (main_df["Date"] > LAST_TRAIN_DATE) & (main_df["Date"] <= LAST_EVAL_DATE)
+        (main_df["Date"] > config.LAST_TRAIN_DATE)
+        & (main_df["Date"] <= config.LAST_EVAL_DATE)
     ].copy()
-    test_df = main_df[main_df["Date"] > LAST_EVAL_DATE].copy()
+    test_df = main_df[main_df["Date"] > config.LAST_EVAL_DATE].copy()
     return train_df, eval_df, test_df
 
 
-def _train(main_df: pd.DataFrame, iterations: int = 1000):
+@instrumented("train")
+def _train(
+    main_df: pd.DataFrame,
+    iterations: int = 1000,
+    workers: int = None,
+    compact: bool = False,
+    pool_cache_key: str = None,
+    catboost_params: dict = None,
+):
 
-    train_df, eval_df, _ = split_dfs(main_df)
+    train_df, eval_df, _ = split_dfs(main_df, copy=not compact)
 
     train_features_df, train_labels = preprocess_df(train_df)
     eval_features_df, eval_labels = preprocess_df(eval_df)
 
+    # (model name, target, CatBoostRegressor params) - one model per target for now
+    params = {"iterations": iterations, **(catboost_params or {})}
+    jobs = [(t, t, params) for t in targets]
+    training_data = (train_features_df, train_labels, eval_features_df, eval_labels)
+
+    catboost_models = {}
+    with training_pools(training_data, cache_key=pool_cache_key) as pools:
+        for name, target, model in _run_training_jobs(jobs, pools, workers):
+            print(
+                "CatBoost: prediction of %s: RMSLE on validation = %s"
+                % (target, model.evals_result_["validation"]["RMSE"][-1])
+            )
+            _set_training_metadata(
+                model, train_df["Date"].max(), train_features_df.columns
+            )
+            catboost_models[name] = model
+
+    return catboost_models
+
+
+@instrumented("train_from_dataset")
+def _train_from_dataset(dataset_directory: str, iterations: int = 1000):
+    pool_paths, feature_columns, last_train_date = _write_pool_files(dataset_directory)
+
     catboost_models = {}
-    for prediction_name in targets:
+    for target in targets:
+        # Pools are loaded from the files one target at a time
+        train_pool, eval_pool = [
+            cb.Pool(path, column_description=pool_paths[target], delimiter="\t")
+            for path in [pool_paths["train"], pool_paths["eval"]]
+        ]
         model = cb.CatBoostRegressor(has_time=True, iterations=iterations)
-        model.fit(
-            train_features_df,
-            train_labels[prediction_name],
-            eval_set=(eval_features_df, eval_labels[prediction_name]),
+        model.fit(train_pool, eval_set=eval_pool, verbose=100)
+        del train_pool, eval_pool
+
+        print(
+            "CatBoost: prediction of %s: RMSLE on validation = %s"
+            % (target, model.evals_result_["validation"]["RMSE"][-1])
+        )
+        _set_training_metadata(model, last_train_date, feature_columns)
+        catboost_models[target] = model
+
+    return catboost_models
+
+
+def _write_pool_files(dataset_directory: str):
+    # Streams the dataset in date order (has_time models rely on it) into
+    # CatBoost's TSV format, with a column description file per target
+    pool_directory = os.path.join(dataset_directory, "pools")
+    os.makedirs(pool_directory, exist_ok=True)
+    pool_paths = {
+        split: os.path.join(pool_directory, f"{split}.tsv")
+        for split in ["train", "eval"]
+    }
+
+    columns, last_train_date = None, None
+    with open(pool_paths["train"], "w") as train_file, open(
+        pool_paths["eval"], "w"
+    ) as eval_file:
+        for date, day_df in iter_feature_dataset_days(
+            dataset_directory, last_date=config.LAST_EVAL_DATE
+        ):
+            features_df, labels = preprocess_df(day_df)
+            rows_df = pd.concat([labels, features_df], axis="columns")
+            columns = list(rows_df.columns)
+            if date <= config.LAST_TRAIN_DATE:
+                last_train_date = date
+            rows_df.to_csv(
+                train_file if date <= config.LAST_TRAIN_DATE else eval_file,
+                sep="\t",
+                header=False,
+                index=False,
+                na_rep="nan",
+                lineterminator="\n",
+            )
+
+    for target in targets:
+        pool_paths[target] = os.path.join(pool_directory, f"{target}.cd")
+        with open(pool_paths[target], "w") as f:
+            for idx, column in enumerate(columns):
+                if column in targets:
+                    column_type = "Label" if column == target else "Auxiliary"
+                else:
+                    column_type = "Categ" if column in cat_features else "Num"
+                f.write(f"{idx}\t{column_type}\t{column}\n")
+
+    feature_columns = [c for c in columns if c not in targets]
+    return pool_paths, feature_columns, last_train_date
+
+
+@instrumented("warm_start_train")
+def _warm_start_train(
+    main_df: pd.DataFrame, models: dict, iterations: int = 100, compact: bool = False
+):
+    # Days appended to train.csv fall after the config split dates, so the
+    # split follows the data: the eval window keeps its length and ends on the
+    # last day with actual counts, the days before it are trained on
+    last_eval_date = main_df.loc[main_df["ConfirmedCases"].notna(), "Date"].max()
+    last_train_date = last_eval_date - (config.LAST_EVAL_DATE - config.LAST_TRAIN_DATE)
+    is_train = main_df["Date"] <= last_train_date
+    is_eval = ~is_train & (main_df["Date"] <= last_eval_date)
+    train_df = main_df.loc[is_train] if compact else main_df.loc[is_train].copy()
+    eval_df = main_df.loc[is_eval] if compact else main_df.loc[is_eval].copy()
+    print(
+        f"Warm start split: train up to {last_train_date.date()}, "
+        f"eval up to {last_eval_date.date()}"
+    )
+
+    train_features_df, train_labels = preprocess_df(train_df)
+    eval_features_df, eval_labels = preprocess_df(eval_df)
+
+    schema = feature_schema_hash(train_features_df.columns)
+    for name, model in models.items():
+        if model.get_metadata().get("feature_schema") != schema:
+            print(f"Feature schema of {name} model changed, training from scratch.")
+            return None
+
+    # Only the models that saw new data are returned
+    catboost_models = {}
+    for name, model in models.items():
+        model_train_date = pd.Timestamp(model.get_metadata()["last_train_date"])
+        new_rows = train_df["Date"] > model_train_date
+        if not new_rows.any():
+            print(
+                f"Warning: no new training days after {model_train_date.date()} "
+                f"for {name}, append days to train.csv; keeping the model."
+            )
+            continue
+
+        print(
+            f"Warm-starting {name} on {new_rows.sum()} rows after {model_train_date.date()}"
+        )
+        warm_model = cb.CatBoostRegressor(has_time=True, iterations=iterations)
+        warm_model.fit(
+            train_features_df[new_rows],
+            train_labels.loc[new_rows, name],
+            eval_set=(eval_features_df, eval_labels[name]),
             cat_features=cat_features,
             verbose=100,
+            init_model=model,
         )
         print(
             "CatBoost: prediction of %s: RMSLE on validation = %s"
-            % (prediction_name, model.evals_result_["validation"]["RMSE"][-1])
+            % (name, warm_model.evals_result_["validation"]["RMSE"][-1])
         )
-        catboost_models[prediction_name] = model
+        _set_training_metadata(warm_model, last_train_date, train_features_df.columns)
+        catboost_models[name] = warm_model
 
     return catboost_models
 
 
+def _set_training_metadata(model, last_train_date, feature_columns):
+    metadata = model.get_metadata()
+    metadata["last_train_date"] = str(last_train_date.date())
+    metadata["feature_schema"] = feature_schema_hash(feature_columns)
+
+
+def _run_training_jobs(jobs, pools, workers: int = None):
+    cpu_count = os.cpu_count() or 1
+    workers = min(workers or cpu_count, len(jobs))
+
+    if workers <= 1:
+        return [_fit_model(job, pools, log_cout=sys.stdout)[:3] for job in jobs]
+
+    # Split the cores between the jobs so that they do not oversubscribe them
+    thread_count = max(1, cpu_count // workers)
+    jobs = [
+        (name, target, {"thread_count": thread_count, **params})
+        for name, target, params in jobs
+    ]
+    print(f"Training {len(jobs)} models in {workers} processes")
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_training_worker,
+        initargs=(pools,),
+    ) as executor:
+        for name, target, model, log in executor.map(_fit_model, jobs):
+            print(f"---------- {name} ----------")
+            print(log, end="")
+            results.append((name, target, model))
+    return results
+
+
+_training_pools = None
+
+
+def _init_training_worker(pools):
+    # Workers get the paths of the quantized pools and load them themselves
+    global _training_pools
+    _training_pools = pools
+
+
+def _fit_model(job, pools=None, log_cout=None):
+    name, target, params = job
+    train_pool, eval_pool = map(as_pool, (pools or _training_pools)[target])
+
+    if log_cout is None:
+        log_cout = io.StringIO()
+        # Concurrent jobs must not share CatBoost's training directory
+        params = {"train_dir": os.path.join("catboost_info", name), **params}
+
+    model = cb.CatBoostRegressor(has_time=True, **params)
+    model.fit(train_pool, eval_set=eval_pool, verbose=100, log_cout=log_cout)
+    log = log_cout.getvalue() if isinstance(log_cout, io.StringIO) else ""
+    return name, target, model, log
+
+
 def _save_models(models: dict):
-    os.makedirs(MODELS_DIR, exist_ok=True)
-    stamp = datetime.now().strftime("%Y%m%d")
     for name, model in models.items():
-        path = os.path.join(MODELS_DIR, f"covid_19_model_{name}_{stamp}.cbm")
-        model.save_model(path)
-        print(f"Saved: {path}")
+        metrics = {}
+        if model.evals_result_ and "validation" in model.evals_result_:
+            metrics["validation_rmse"] = model.evals_result_["validation"]["RMSE"][-1]
+        register_model(model, name, metrics=metrics)
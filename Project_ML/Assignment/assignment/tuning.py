@@ -0,0 +1,231 @@
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import catboost as cb
+
+from assignment.config import (
+    DAYS_HISTORY_SIZE,
+    TUNING_DIR,
+    targets,
+)
+from assignment.feature_store import feature_store_key, load_processed_data
+from assignment.instrumentation import (
+    enable_profiling,
+    stage,
+    start_run,
+    write_run_report,
+)
+from assignment.pools import as_pool, training_pools
+from assignment.train import preprocess_df, split_dfs
+from assignment.utils import feature_schema_hash
+
+# Values tried for each parameter; lag_window keeps the lag features of the
+# last `lag_window` days out of the DAYS_HISTORY_SIZE built by process_data
+search_space = {
+    "depth": [4, 6, 8],
+    "learning_rate": [0.03, 0.1, 0.3],
+    "l2_leaf_reg": [1, 3, 10],
+    "lag_window": [7, 14, DAYS_HISTORY_SIZE],
+}
+
+
+def run(args):
+    start_run()
+    enable_profiling(args.profile_stage, args.profile_mode)
+
+    processed_df = load_processed_data(jobs=args.jobs)
+    train_df, eval_df, _ = split_dfs(processed_df)
+    training_data = (*preprocess_df(train_df), *preprocess_df(eval_df))
+
+    settings = {
+        "search_space": search_space,
+        "trials": args.trials,
+        "eta": args.eta,
+        "min_iterations": args.min_iterations,
+        "max_iterations": args.max_iterations,
+        "early_stopping_rounds": args.early_stopping_rounds,
+        "seed": args.seed,
+        "features": feature_schema_hash(training_data[0].columns),
+        "data": feature_store_key(),
+    }
+    search_key = hashlib.sha256(
+        json.dumps(settings, sort_keys=True).encode()
+    ).hexdigest()[:16]
+    log_path = os.path.join(TUNING_DIR, f"trials_{search_key}.jsonl")
+
+    # Trials share the quantized pools of `train`, with the lags outside
+    # their window ignored instead of cut out of the frames
+    lag_days = {
+        column: int(column.rsplit("_", 1)[1])
+        for column in training_data[0].columns
+        if "_prev_day_" in column
+    }
+    best = {}
+    with stage("tune"), training_pools(training_data, settings["data"]) as pools:
+        for target in args.targets or targets:
+            best[target] = successive_halving(
+                target, (pools, lag_days), settings, log_path, workers=args.jobs
+            )
+
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    best_path = os.path.join(TUNING_DIR, f"best_params_{search_key}.json")
+    with open(best_path, "w") as f:
+        json.dump(best, f, indent=2)
+    print(f"Best parameters saved to {best_path}")
+    write_run_report(TUNING_DIR, "tune")
+    return best
+
+
+def sample_configs(n_trials: int, seed: int = 0):
+    # Distinct points of the grid, in an order fixed by the seed
+    grid = list(itertools.product(*search_space.values()))
+    order = np.random.default_rng(seed).permutation(len(grid))[:n_trials]
+    return [dict(zip(search_space, grid[i])) for i in order]
+
+
+def rung_budgets(min_iterations: int, max_iterations: int, eta: int):
+    budgets = [min_iterations]
+    while budgets[-1] * eta <= max_iterations:
+        budgets.append(budgets[-1] * eta)
+    return budgets
+
+
+def successive_halving(target, training_data, settings, log_path, workers: int = 1):
+    # Every rung trains the surviving configs with `eta` times more iterations
+    # than the previous one and keeps the best 1/eta of them on eval RMSE
+    configs = dict(enumerate(sample_configs(settings["trials"], settings["seed"])))
+    done = _read_trials(log_path)
+
+    budgets = rung_budgets(
+        settings["min_iterations"], settings["max_iterations"], settings["eta"]
+    )
+    for rung, iterations in enumerate(budgets):
+        trials = [
+            {
+                "target": target,
+                "trial_id": trial_id,
+                "iterations": iterations,
+                "params": config,
+                "early_stopping_rounds": settings["early_stopping_rounds"],
+            }
+            for trial_id, config in configs.items()
+        ]
+        results = _run_trials(trials, training_data, done, log_path, workers)
+
+        print(f"{target} rung {rung}: {len(trials)} trials of {iterations} iterations")
+        ranked = sorted(results, key=lambda r: (r["eval_rmse"], r["trial_id"]))
+        for result in ranked[:3]:
+            print(
+                f"  trial {result['trial_id']:3d} RMSE {result['eval_rmse']:.5f} "
+                f"at iteration {result['best_iteration']} {result['params']}"
+            )
+        if rung < len(budgets) - 1:
+            n_kept = max(1, len(ranked) // settings["eta"])
+            configs = {r["trial_id"]: configs[r["trial_id"]] for r in ranked[:n_kept]}
+
+    return {**ranked[0]["params"], "iterations": ranked[0]["best_iteration"] + 1}
+
+
+def _run_trials(trials, training_data, done, log_path, workers: int = 1):
+    # Trials already in the log are not run again, so an interrupted search
+    # resumes where it stopped; new results are appended as they finish
+    results = [done[_trial_key(trial)] for trial in trials if _trial_key(trial) in done]
+    pending = [trial for trial in trials if _trial_key(trial) not in done]
+    if not pending:
+        return results
+
+    os.makedirs(TUNING_DIR, exist_ok=True)
+    cpu_count = os.cpu_count() or 1
+    workers = min(workers or cpu_count, len(pending))
+    with open(log_path, "a") as log_file:
+        if workers <= 1:
+            finished = (_run_trial(trial, training_data) for trial in pending)
+            for result in finished:
+                _log_trial(result, results, done, log_file)
+            return results
+
+        # Bounded threads per trial, so concurrent trials share the cores
+        thread_count = max(1, cpu_count // workers)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_tuning_worker,
+            initargs=(training_data,),
+        ) as executor:
+            futures = [
+                executor.submit(_run_trial, {**trial, "thread_count": thread_count})
+                for trial in pending
+            ]
+            for future in as_completed(futures):
+                _log_trial(future.result(), results, done, log_file)
+    return results
+
+
+def _log_trial(result, results, done, log_file):
+    log_file.write(json.dumps(result) + "\n")
+    log_file.flush()
+    done[_trial_key(result)] = result
+    results.append(result)
+
+
+def _trial_key(trial):
+    return trial["target"], trial["trial_id"], trial["iterations"]
+
+
+def _read_trials(log_path: str) -> dict:
+    done = {}
+    if not os.path.exists(log_path):
+        return done
+    with open(log_path) as f:
+        lines = f.read().splitlines()
+    for line in lines:
+        try:
+            result = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        done[_trial_key(result)] = result
+
+    if len(done) < len(lines):
+        # A search killed mid-write leaves a partial last line, drop it so
+        # that appended results start on a line of their own
+        with open(log_path, "w") as f:
+            f.writelines(json.dumps(result) + "\n" for result in done.values())
+    print(f"Resuming search from {log_path} ({len(done)} trials done)")
+    return done
+
+
+_training_data = None
+
+
+def _init_tuning_worker(training_data):
+    global _training_data
+    _training_data = training_data
+
+
+def _run_trial(trial, training_data=None):
+    pools, lag_days = training_data or _training_data
+    train_pool, eval_pool = map(as_pool, pools[trial["target"]])
+    params = dict(trial["params"])
+    lag_window = params.pop("lag_window")
+    ignored_features = [c for c, day in lag_days.items() if day > lag_window]
+
+    model = cb.CatBoostRegressor(
+        has_time=True,
+        iterations=trial["iterations"],
+        early_stopping_rounds=trial["early_stopping_rounds"],
+        thread_count=trial.get("thread_count", -1),
+        allow_writing_files=False,
+        ignored_features=ignored_features or None,
+        **params,
+    )
+    model.fit(train_pool, eval_set=eval_pool, verbose=False)
+    return {
+        "target": trial["target"],
+        "trial_id": trial["trial_id"],
+        "iterations": trial["iterations"],
+        "params": trial["params"],
+        "eval_rmse": model.best_score_["validation"]["RMSE"],
+        "best_iteration": model.best_iteration_,
+    }
@@ -1,99 +1,130 @@
+import numpy as np
 import pandas as pd
 import os, glob
-import catboost as cb
-from assignment.config import MODELS_DIR, targets, PREDICTIONS_DIR
-
-
-def get_hubei_coords(df):
-    for index, row in df.iterrows():
-        if row["Province/State"] == "Hubei":
-            return (row["Lat"], row["Long"])
-
-    raise Exception("Hubei not found in data")
-
-
-def merge_with_column_drop(left_df, right_df, right_df_column="Country"):
-    df = pd.merge(
-        left=left_df,
-        right=right_df,
-        how="left",
-        left_on="Country/Region",
-        right_on=right_df_column,
-    )
-    df.drop(columns=right_df_column, inplace=True)
-
+import hashlib
+import json
+from assignment import config
+from assignment.config import targets
+from assignment.registry import latest_model_paths, load_model_file
+from assignment.instrumentation import peak_rss_mb
+
+
+def get_location_coords(df, country_region, province_state=""):
+    location_df = df.loc[
+        (df["Country/Region"] == country_region)
+        & (df["Province/State"] == province_state)
+    ]
+    if location_df.empty:
+        raise Exception(f"{country_region} {province_state} not found in data")
+
+    return (location_df["Lat"].iloc[0], location_df["Long"].iloc[0])
+
+
+def join_country_features(df, country_df, country_column="Country/Region"):
+    # Adds the columns of `country_df` (indexed by country) to `df` in place
+    positions = country_df.index.get_indexer(df[country_column])
+    missing = positions == -1
+    for column in country_df.columns:
+        values = country_df[column].to_numpy()[positions]
+        if missing.any():
+            values = np.where(missing, np.nan, values)
+        df[column] = values
     return df
 
 
-def remap_country_name_from_world_bank_to_df_name(country):
-    return {
-        "Bahamas, The": "The Bahamas",
-        "Brunei Darussalam": "Brunei",
-        "Congo, Rep.": "Congo (Brazzaville)",
-        "Congo, Dem. Rep.": "Congo (Kinshasa)",
-        "Czech Republic": "Czechia",
-        "Egypt, Arab Rep.": "Egypt",
-        "Iran, Islamic Rep.": "Iran",
-        "Korea, Rep.": "Korea, South",
-        "Kyrgyz Republic": "Kyrgyzstan",
-        "Russian Federation": "Russia",
-        "Slovak Republic": "Slovakia",
-        "St. Lucia": "Saint Lucia",
-        "St. Vincent and the Grenadines": "Saint Vincent and the Grenadines",
-        "United States": "US",
-        "Venezuela, RB": "Venezuela",
-    }.get(country, country)
-
-
-def remap_country_name_from_un_wpp_to_df_name(country):
-    return {
-        "Bahamas": "The Bahamas",
-        "Bolivia (Plurinational State of)": "Bolivia",
-        "Brunei Darussalam": "Brunei",
-        "China, Taiwan Province of China": "Taiwan*",
-        "Congo": "Congo (Brazzaville)",
-        "Côte d'Ivoire": "Cote d'Ivoire",
-        "Democratic Republic of the Congo": "Congo (Kinshasa)",
-        "Gambia": "The Gambia",
-        "Iran (Islamic Republic of)": "Iran",
-        "Republic of Korea": "Korea, South",
-        "Republic of Moldova": "Moldova",
-        "Réunion": "Reunion",
-        "Russian Federation": "Russia",
-        "United Republic of Tanzania": "Tanzania",
-        "United States of America": "US",
-        "Venezuela (Bolivarian Republic of)": "Venezuela",
-        "Viet Nam": "Vietnam",
-    }.get(country, country)
-
-
-def find_latest_model(target):
-    pattern = os.path.join(MODELS_DIR, f"covid_19_model_{target}_*.cbm")
-    files = glob.glob(pattern)
-    return max(files, key=os.path.getmtime) if files else None
+world_bank_country_names = {
+    "Bahamas, The": "The Bahamas",
+    "Brunei Darussalam": "Brunei",
+    "Congo, Rep.": "Congo (Brazzaville)",
+    "Congo, Dem. Rep.": "Congo (Kinshasa)",
+    "Czech Republic": "Czechia",
+    "Egypt, Arab Rep.": "Egypt",
+    "Iran, Islamic Rep.": "Iran",
+    "Korea, Rep.": "Korea, South",
+    "Kyrgyz Republic": "Kyrgyzstan",
+    "Russian Federation": "Russia",
+    "Slovak Republic": "Slovakia",
+    "St. Lucia": "Saint Lucia",
+    "St. Vincent and the Grenadines": "Saint Vincent and the Grenadines",
+    "United States": "US",
+    "Venezuela, RB": "Venezuela",
+}
+
+un_wpp_country_names = {
+    "Bahamas": "The Bahamas",
+    "Bolivia (Plurinational State of)": "Bolivia",
+    "Brunei Darussalam": "Brunei",
+    "China, Taiwan Province of China": "Taiwan*",
+    "Congo": "Congo (Brazzaville)",
+    "Côte d'Ivoire": "Cote d'Ivoire",
+    "Democratic Republic of the Congo": "Congo (Kinshasa)",
+    "Gambia": "The Gambia",
+    "Iran (Islamic Republic of)": "Iran",
+    "Republic of Korea": "Korea, South",
+    "Republic of Moldova": "Moldova",
+    "Réunion": "Reunion",
+    "Russian Federation": "Russia",
+    "United Republic of Tanzania": "Tanzania",
+    "United States of America": "US",
+    "Venezuela (Bolivarian Republic of)": "Venezuela",
+    "Viet Nam": "Vietnam",
+}
+
+
+def remap_country_names(names: pd.Series, mapping: dict) -> pd.Series:
+    # On a categorical only the distinct names are mapped
+    return names.map(lambda name: mapping.get(name, name)).astype("category")
+
+
+def is_pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def print_memory_usage(**frames):
+    for name, df in frames.items():
+        size_mb = df.memory_usage(deep=True).sum() / 2**20
+        print(f"Memory: {name} {df.shape} uses {size_mb:.1f} MB")
+
+    peak_rss = peak_rss_mb()
+    if peak_rss is not None:
+        print(f"Memory: peak process RSS {peak_rss:.1f} MB")
+
+
+def feature_schema_hash(feature_columns):
+    # The ordered feature names a model was trained on; warm starts and cached
+    # pools are only reused when they are unchanged
+    schema = json.dumps(list(feature_columns))
+    return hashlib.sha256(schema.encode()).hexdigest()[:16]
 
 
 def load_latest_models():
-    models = {}
-    for t in targets:
-        path = find_latest_model(t)
-        if not path:
-            return None
-        m = cb.CatBoostRegressor()
-        m.load_model(path)
-        models[t] = m
-    return models
-
-
-def load_latest_predictions():
-    pattern = os.path.join(PREDICTIONS_DIR, "predictions_*.csv")
-    files = glob.glob(pattern)
+    paths = latest_model_paths(targets)
+    if paths is None:
+        return None
+    return {t: load_model_file(path) for t, path in paths.items()}
+
+
+def load_latest_predictions(columns=None):
+    # Reads only `columns` when given; CSVs are written with --csv, without
+    # pyarrow or by versions before the Parquet artifact
+    files = glob.glob(os.path.join(config.PREDICTIONS_DIR, "predictions_*.parquet"))
+    files += glob.glob(os.path.join(config.PREDICTIONS_DIR, "predictions_*.csv"))
     if not files:
         raise FileNotFoundError(
-            f"No predictions found in {PREDICTIONS_DIR}. "
+            f"No predictions found in {config.PREDICTIONS_DIR}. "
             "Please run `poetry run predict` first."
         )
-    files.sort(key=os.path.getmtime, reverse=True)
-    latest_path = files[0]
+    latest_path = max(files, key=os.path.getmtime)
+    parquet_path = os.path.splitext(latest_path)[0] + ".parquet"
+    if os.path.exists(parquet_path) and is_pyarrow_available():
+        latest_path = parquet_path
     print(f"Loading predictions from: {latest_path}")
-    return pd.read_csv(latest_path)
+
+    if latest_path.endswith(".parquet"):
+        return pd.read_parquet(latest_path, columns=columns)
+    parse_dates = ["Date"] if columns is None or "Date" in columns else None
+    return pd.read_csv(latest_path, usecols=columns, parse_dates=parse_dates)
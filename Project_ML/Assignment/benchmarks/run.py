@@ -0,0 +1,208 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import time
+
+from assignment.features import process_confirmed_case_and_fatality, process_location
+from assignment.predict import run_predictions
+from assignment.train import _train
+from benchmarks.synthetic import make_main_df
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baseline.json"
+)
+# Stored in the baseline file, next to the timings it describes
+BASELINE_NOTE = (
+    "Seconds per stage on the reference machine, meaningless on other machines. "
+    "Regenerate with --update-baseline there whenever a change makes a stage "
+    "faster or slower."
+)
+
+# Hubei, so that the synthetic panel does not need to contain it
+origins = {"origin": (30.9756, 112.2707)}
+# Timed trainings must not write catboost_info/ into the working directory
+catboost_params = {"allow_writing_files": False}
+
+
+def bench_process_location(inputs, params):
+    return lambda: process_location(
+        inputs["main_df"].copy(), days_history_size=params["days_history_size"]
+    )
+
+
+def bench_process_confirmed_case_and_fatality(inputs, params):
+    return lambda: process_confirmed_case_and_fatality(
+        inputs["location_df"].copy(), origins=origins
+    )
+
+
+def bench_train(inputs, params):
+    return lambda: _train(
+        inputs["processed_df"],
+        iterations=params["iterations"],
+        workers=1,
+        catboost_params=catboost_params,
+    )
+
+
+def bench_predict(inputs, params):
+    return lambda: run_predictions(inputs["models"], inputs["processed_df"])
+
+
+# Stage name -> function returning the callable to time for prepared inputs
+stages = {
+    "process_location": bench_process_location,
+    "process_confirmed_case_and_fatality": bench_process_confirmed_case_and_fatality,
+    "train": bench_train,
+    "predict": bench_predict,
+}
+
+
+def prepare_inputs(n_locations: int, params: dict) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        main_df = make_main_df(n_locations, params["n_days"], seed=params["seed"])
+        location_df = process_location(
+            main_df.copy(), days_history_size=params["days_history_size"]
+        )
+        processed_df = process_confirmed_case_and_fatality(
+            location_df.copy(), origins=origins
+        )
+        models = _train(
+            processed_df,
+            iterations=params["iterations"],
+            workers=1,
+            catboost_params=catboost_params,
+        )
+    return {
+        "main_df": main_df,
+        "location_df": location_df,
+        "processed_df": processed_df,
+        "models": models,
+    }
+
+
+def time_stage(run, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def scaling_exponent(sizes, timings) -> float:
+    # Slope of log(time) over log(size) between the smallest and largest size
+    return math.log(timings[-1] / timings[0]) / math.log(sizes[-1] / sizes[0])
+
+
+def run_benchmarks(stage_names, sizes, params, repeat: int = 3) -> dict:
+    results = {name: {} for name in stage_names}
+    for n_locations in sizes:
+        inputs = prepare_inputs(n_locations, params)
+        for name in stage_names:
+            seconds = time_stage(stages[name](inputs, params), repeat)
+            results[name][size_key(n_locations, params)] = round(seconds, 4)
+            print(f"{name:40s} {n_locations:6d} locations {seconds:9.4f} s")
+    return results
+
+
+def size_key(n_locations: int, params: dict) -> str:
+    return f"{n_locations}x{params['n_days']}"
+
+
+def check_results(results, sizes, params, baseline, tolerance, max_exponent):
+    failures = []
+    for name, timings in results.items():
+        keys = [size_key(n, params) for n in sizes]
+        if len(sizes) > 1:
+            exponent = scaling_exponent(sizes, [timings[k] for k in keys])
+            print(f"{name:40s} scaling exponent {exponent:.2f}")
+            if exponent > max_exponent:
+                failures.append(
+                    f"{name} scales as n^{exponent:.2f} (max n^{max_exponent})"
+                )
+
+        for key in keys:
+            expected = baseline.get(name, {}).get(key)
+            if expected and timings[key] > expected * tolerance:
+                failures.append(
+                    f"{name} at {key} took {timings[key]:.4f} s, baseline {expected:.4f} s"
+                )
+    return failures
+
+
+def _read_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def cli_entrypoint(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pipeline stages on synthetic panels."
+    )
+    parser.add_argument(
+        "--stages", nargs="+", choices=list(stages), default=list(stages)
+    )
+    parser.add_argument("--locations", nargs="+", type=int, default=[200, 800])
+    parser.add_argument("--days", type=int, default=63)
+    parser.add_argument("--days-history-size", type=int, default=30)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=2.0,
+        help="fail when a stage is this many times slower than its baseline",
+    )
+    parser.add_argument(
+        "--max-exponent",
+        type=float,
+        default=1.5,
+        help="fail when a stage grows faster than n^max-exponent with the locations",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the timings of this run as the new baseline",
+    )
+    args = parser.parse_args(argv)
+
+    params = {
+        "n_days": args.days,
+        "days_history_size": args.days_history_size,
+        "iterations": args.iterations,
+        "seed": args.seed,
+    }
+    sizes = sorted(args.locations)
+    results = run_benchmarks(args.stages, sizes, params, repeat=args.repeat)
+
+    baseline = _read_baseline(args.baseline)
+    if args.update_baseline:
+        for name, timings in results.items():
+            baseline.setdefault(name, {}).update(timings)
+        baseline["note"] = BASELINE_NOTE
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    failures = check_results(
+        results, sizes, params, baseline, args.tolerance, args.max_exponent
+    )
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli_entrypoint()
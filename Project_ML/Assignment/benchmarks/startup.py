@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from assignment.config import targets
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the no-op and cached paths of the CLI must not import
+heavy_modules = ["pandas", "numpy", "catboost", "geopy", "matplotlib", "requests"]
+
+# Runs one command of assignment.cli in a fresh interpreter, the last line of
+# its output lists the heavy modules that got imported
+command_script = """
+import json, sys
+from assignment import cli
+try:
+    getattr(cli, sys.argv[1])(sys.argv[2:])
+except SystemExit:
+    pass
+print(json.dumps([m for m in {heavy_modules!r} if m in sys.modules]))
+"""
+
+
+def startup_cases(models_dir: str) -> dict:
+    return {
+        "train --help": ["train", "--help"],
+        "predict --help": ["predict", "--help"],
+        "plot --help": ["plot", "--help"],
+        "backtest --help": ["backtest", "--help"],
+        "tune --help": ["tune", "--help"],
+        "train (models exist)": ["train", "--models-dir", models_dir],
+    }
+
+
+def time_command(args, repeat: int):
+    # Best wall time of `repeat` runs and the heavy modules of the last one
+    script = command_script.format(heavy_modules=heavy_modules)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", script, *args],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        timings.append(time.perf_counter() - start)
+    return min(timings), json.loads(result.stdout.splitlines()[-1])
+
+
+def interpreter_startup(repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _make_models_dir(directory: str):
+    # Empty files are enough, the cached path only checks that models exist
+    for target in targets:
+        open(os.path.join(directory, f"covid_19_model_{target}_0.cbm"), "w").close()
+
+
+def cli_entrypoint(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the startup time of the CLI commands."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.3,
+        help="fail when a command takes longer than this many seconds on top of the interpreter startup",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = interpreter_startup(args.repeat)
+    print(f"{'python -c pass':30s} {baseline:7.3f} s")
+
+    failures = []
+    with tempfile.TemporaryDirectory() as models_dir:
+        _make_models_dir(models_dir)
+        for name, command in startup_cases(models_dir).items():
+            seconds, imported = time_command(command, args.repeat)
+            overhead = seconds - baseline
+            print(f"{name:30s} {seconds:7.3f} s (+{overhead:.3f} s)")
+            if overhead > args.budget:
+                failures.append(
+                    f"{name} takes {overhead:.3f} s over the interpreter startup (budget {args.budget} s)"
+                )
+            if imported:
+                failures.append(f"{name} imports {', '.join(imported)}")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli_entrypoint()
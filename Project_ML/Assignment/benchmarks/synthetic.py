@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from assignment.config import LAST_EVAL_DATE, LAST_TEST_DATE, LAST_TRAIN_DATE
+from assignment.data_load import combine_train_and_test
+
+# Kaggle week-1 test.csv starts the day after the last training date
+FIRST_TEST_DATE = LAST_TRAIN_DATE + pd.Timedelta(days=1)
+
+
+def make_panel(n_locations: int = 300, n_days: int = 63, seed: int = 0):
+    # Returns (train_df, test_df) with the schema of train.csv / test.csv: one row
+    # per location and day, `n_days` of history ending on LAST_EVAL_DATE
+    if LAST_EVAL_DATE - pd.Timedelta(days=n_days - 1) > LAST_TRAIN_DATE:
+        raise ValueError(f"n_days={n_days} does not reach back to {LAST_TRAIN_DATE}")
+    rng = np.random.default_rng(seed)
+
+    locations = _make_locations(n_locations, rng)
+    train_dates = pd.date_range(end=LAST_EVAL_DATE, periods=n_days)
+    test_dates = pd.date_range(FIRST_TEST_DATE, LAST_TEST_DATE)
+
+    confirmed, fatalities = _make_cumulative_counts(n_locations, n_days, rng)
+    train_df = _expand(locations, train_dates)
+    train_df.insert(0, "Id", np.arange(1, len(train_df) + 1))
+    train_df["ConfirmedCases"] = confirmed.ravel()
+    train_df["Fatalities"] = fatalities.ravel()
+
+    test_df = _expand(locations, test_dates)
+    test_df.insert(0, "ForecastId", np.arange(1, len(test_df) + 1))
+    return train_df, test_df
+
+
+def make_main_df(n_locations: int = 300, n_days: int = 63, seed: int = 0):
+    # Same frame as `load_data` returns for the Kaggle files
+    return combine_train_and_test(*make_panel(n_locations, n_days, seed))
+
+
+def _make_locations(n_locations: int, rng) -> pd.DataFrame:
+    # About a third of the countries are split into provinces, like US or China
+    country_ids = np.sort(rng.integers(0, max(1, n_locations * 2 // 3), n_locations))
+    province_ids = pd.Series(country_ids).groupby(country_ids).cumcount().to_numpy()
+    has_provinces = pd.Series(country_ids).duplicated(keep=False).to_numpy()
+    return pd.DataFrame(
+        {
+            "Province/State": pd.Series([f"Province {i}" for i in province_ids]).where(
+                has_provinces
+            ),
+            "Country/Region": [f"Country {i}" for i in country_ids],
+            "Lat": rng.uniform(-60, 70, n_locations).round(4),
+            "Long": rng.uniform(-180, 180, n_locations).round(4),
+        }
+    )
+
+
+def _make_cumulative_counts(n_locations: int, n_days: int, rng):
+    # Logistic epidemic curves with random onset, speed and size, sampled as
+    # Poisson daily increments so the cumulative counts look like the real ones
+    days = np.arange(n_days)
+    onset = rng.uniform(0, n_days, (n_locations, 1))
+    growth = rng.uniform(0.1, 0.4, (n_locations, 1))
+    size = 10 ** rng.uniform(1, 5, (n_locations, 1))
+    expected = size / (1 + np.exp(-growth * (days - onset - 10)))
+    expected_new = np.diff(expected, axis=1, prepend=0)
+
+    new_confirmed = rng.poisson(np.maximum(expected_new, 0))
+    new_fatalities = rng.binomial(new_confirmed, rng.uniform(0, 0.05, (n_locations, 1)))
+    return (
+        new_confirmed.cumsum(axis=1).astype("float64"),
+        new_fatalities.cumsum(axis=1).astype("float64"),
+    )
+
+
+def _expand(locations: pd.DataFrame, dates) -> pd.DataFrame:
+    # Rows ordered by location then date, like the Kaggle files
+    df = locations.loc[locations.index.repeat(len(dates))].reset_index(drop=True)
+    df.insert(4, "Date", np.tile(dates.to_numpy(), len(locations)))
+    return df
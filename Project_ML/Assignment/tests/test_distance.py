@@ -0,0 +1,55 @@
+import geopy.distance
+import numpy as np
+import pytest
+
+from assignment.distance import haversine_km, vincenty_km
+
+# (Lat, Long) origins the features are measured from
+origins = [(30.9756, 112.2707), (0.0, 0.0), (90.0, 0.0), (-33.87, 151.21)]
+
+
+def _points(origin, n_random: int = 200, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    origin_lat, origin_long = origin
+    lat = np.concatenate(
+        [
+            rng.uniform(-90, 90, n_random),
+            # Equator, poles, the origin itself and a nearly antipodal point,
+            # on which Vincenty does not converge and falls back to geopy
+            [0.0, 0.0, 90.0, -90.0, origin_lat, -origin_lat + 0.5],
+        ]
+    )
+    long = np.concatenate(
+        [
+            rng.uniform(-180, 180, n_random),
+            [45.0, -179.5, 0.0, 12.0, origin_long, origin_long - 179.7],
+        ]
+    )
+    return lat, long
+
+
+def _geopy_km(lat, long, origin):
+    return np.array(
+        [geopy.distance.distance((a, b), origin).km for a, b in zip(lat, long)]
+    )
+
+
+@pytest.mark.parametrize("origin", origins)
+def test_vincenty_matches_geopy(origin):
+    lat, long = _points(origin)
+    np.testing.assert_allclose(
+        vincenty_km(lat, long, *origin), _geopy_km(lat, long, origin), rtol=0, atol=1e-6
+    )
+
+
+# The sphere is within 0.5% of the ellipsoid except between points near the
+# equator, where it is up to ~0.56% short
+@pytest.mark.parametrize("origin", [o for o in origins if o[0] != 0.0])
+def test_haversine_matches_geopy(origin):
+    lat, long = _points(origin)
+    np.testing.assert_allclose(
+        haversine_km(lat, long, *origin),
+        _geopy_km(lat, long, origin),
+        rtol=5e-3,
+        atol=1e-9,
+    )
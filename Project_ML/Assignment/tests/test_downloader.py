@@ -0,0 +1,119 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from assignment.downloader import download_datasets
+
+ETAG = '"v1"'
+
+
+def _zip_bytes(name: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        zip_file.writestr(f"{name}.csv", "x,y\n" + "1,2\n" * 10_000)
+        zip_file.writestr(f"{name}_metadata.csv", "a,b\n")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def server():
+    # Stand-in for the dataset hosts: serves the archives with an ETag and
+    # answers a Range request with If-Range like they do
+    files = {"/area.zip": _zip_bytes("area"), "/population.zip": _zip_bytes("pop")}
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = files[self.path]
+            byte_range = self.headers.get("Range")
+            requests.append((self.path, byte_range))
+            if byte_range and self.headers.get("If-Range") == ETAG:
+                start = int(byte_range.split("=")[1].rstrip("-"))
+                body = body[start:]
+                self.send_response(206)
+            else:
+                self.send_response(200)
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{http_server.server_port}", files, requests
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def _datasets(tmp_path, url):
+    return [
+        (str(tmp_path / "area"), "area.zip", f"{url}/area.zip", None),
+        (
+            str(tmp_path / "population"),
+            "population.zip",
+            f"{url}/population.zip",
+            str(tmp_path / "population" / "population.csv"),
+        ),
+    ]
+
+
+def test_cached_archives_are_not_downloaded_again(server, tmp_path, capsys):
+    url, files, requests = server
+    datasets = _datasets(tmp_path, url)
+    manifest_path = str(tmp_path / "downloads.json")
+
+    download_datasets(datasets, manifest_path=manifest_path)
+    assert sorted(path for path, _ in requests) == ["/area.zip", "/population.zip"]
+    assert sorted(os.listdir(tmp_path / "area")) == [
+        "area.csv",
+        "area.zip",
+        "area_metadata.csv",
+    ]
+    assert sorted(os.listdir(tmp_path / "population")) == [
+        "population.csv",
+        "population.zip",
+    ]
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest[f"{url}/area.zip"] == {
+        "etag": ETAG,
+        "sha256": hashlib.sha256(files["/area.zip"]).hexdigest(),
+        "size": len(files["/area.zip"]),
+    }
+
+    requests.clear()
+    capsys.readouterr()
+    download_datasets(datasets, manifest_path=manifest_path)
+    assert requests == []
+    # One line per archive
+    assert sorted(capsys.readouterr().out.splitlines()) == [
+        "area.zip: cached, extracted 0 files, 2 already there",
+        "population.zip: cached, extracted 0 files, 1 already there",
+    ]
+
+
+def test_partial_download_is_resumed(server, tmp_path, capsys):
+    url, files, requests = server
+    datasets = _datasets(tmp_path, url)[:1]
+    area_dir = tmp_path / "area"
+    area_dir.mkdir()
+    (area_dir / "area.zip.part").write_bytes(files["/area.zip"][:1000])
+    (area_dir / "area.zip.part.etag").write_text(ETAG)
+
+    download_datasets(datasets, manifest_path=str(tmp_path / "downloads.json"))
+
+    assert requests == [("/area.zip", "bytes=1000-")]
+    assert "(resumed at 0.0 MB)" in capsys.readouterr().out
+    assert (area_dir / "area.zip").read_bytes() == files["/area.zip"]
+    assert not (area_dir / "area.zip.part").exists()
+    assert not (area_dir / "area.zip.part.etag").exists()
@@ -0,0 +1,143 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from assignment import config
+from assignment import features
+from assignment.data_load import combine_train_and_test
+from assignment.features import (
+    _preprocess_location,
+    iter_processed_chunks,
+    process_data,
+    process_location,
+)
+
+DAYS_HISTORY_SIZE = 5
+
+
+# Per-location loop that process_location replaced, kept as the reference
+def _reference_is_cumulative(increment_series):
+    for v in increment_series:
+        if (not np.isnan(v)) and (v < 0):
+            return False
+    return True
+
+
+def _reference_add_prev_day_columns(df: pd.DataFrame, days_history_size: int):
+    for field in ["LogNewConfirmedCases", "LogNewFatalities"]:
+        df[field] = np.nan
+        for prev_day in range(1, days_history_size + 1):
+            df[f"{field}_prev_day_{prev_day}"] = np.nan
+    return df
+
+
+def _reference_process_location_group(
+    df: pd.DataFrame,
+    days_history_size: int,
+    location_columns: List[str] = ["Country/Region", "Province/State"],
+):
+    for location_name, location_df in df.groupby(location_columns):
+        for field in ["ConfirmedCases", "Fatalities"]:
+            new_values = location_df[field].values.copy()
+            new_values[1:] -= new_values[:-1]
+            if not _reference_is_cumulative(new_values):
+                df.drop(index=location_df.index, inplace=True)
+                break
+            log_new_values = np.log1p(new_values)
+            df.loc[location_df.index, f"LogNew{field}"] = log_new_values
+
+            for prev_day in range(1, days_history_size + 1):
+                df.loc[
+                    location_df.index[prev_day:], f"LogNew{field}_prev_day_{prev_day}"
+                ] = log_new_values[:-prev_day]
+    return df
+
+
+def _reference_process_location(df: pd.DataFrame, days_history_size: int):
+    df = _preprocess_location(df)
+    df = _reference_add_prev_day_columns(df, days_history_size)
+    return _reference_process_location_group(df, days_history_size)
+
+
+def _make_panel(n_days: int = 12, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    locations = [
+        ("Italy", np.nan),
+        ("China", "Hubei"),
+        ("China", "Beijing"),
+        ("US", "Kansas"),
+        ("Broken", np.nan),
+    ]
+    dates = pd.date_range("2020-03-01", periods=n_days)
+    rows = []
+    for country, province in locations:
+        confirmed = np.cumsum(rng.integers(0, 50, n_days)).astype(float)
+        fatalities = np.cumsum(rng.integers(0, 5, n_days)).astype(float)
+        if country == "Broken":
+            # Not a cumulative series, the whole location must be dropped
+            confirmed[n_days // 2] = 0.0
+        for date, cases, deaths in zip(dates, confirmed, fatalities):
+            rows.append(
+                {
+                    "Province/State": province,
+                    "Country/Region": country,
+                    "Date": date,
+                    "ConfirmedCases": cases,
+                    "Fatalities": deaths,
+                }
+            )
+    # Rows of a location are not contiguous in train.csv order
+    return pd.DataFrame(rows).sample(frac=1, random_state=seed)
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.sort_values(["Country/Region", "Province/State", "Date"])
+    return df.reset_index(drop=True)
+
+
+def test_process_location_matches_reference_loop():
+    panel_df = _make_panel()
+
+    expected_df = _reference_process_location(panel_df.copy(), DAYS_HISTORY_SIZE)
+    actual_df = process_location(panel_df.copy(), days_history_size=DAYS_HISTORY_SIZE)
+
+    assert "Broken" not in set(actual_df["Country/Region"])
+    pd.testing.assert_frame_equal(_sorted(actual_df), _sorted(expected_df))
+
+
+def _week_1_panel() -> pd.DataFrame:
+    train_df = pd.read_csv(config.COVID19_TRAIN_DATASET_PATH, parse_dates=["Date"])
+    test_df = pd.read_csv(config.COVID19_TEST_DATASET_PATH, parse_dates=["Date"])
+    return combine_train_and_test(train_df, test_df)
+
+
+def _country_features(countries) -> pd.DataFrame:
+    # Stands in for the downloaded World Bank and UN WPP datasets
+    countries = pd.Index(countries, name="Country/Region")
+    return pd.DataFrame({"CountryNameLength": countries.str.len()}, index=countries)
+
+
+def test_process_data_in_parallel_matches_single_process(monkeypatch):
+    monkeypatch.setattr(features, "build_country_features", _country_features)
+    main_df = _week_1_panel()
+
+    expected_df = process_data(main_df.copy(), jobs=1)
+    actual_df = process_data(main_df.copy(), jobs=2)
+
+    assert actual_df.equals(expected_df)
+
+
+def test_streamed_chunks_match_process_data(monkeypatch):
+    monkeypatch.setattr(features, "build_country_features", _country_features)
+    main_df = _week_1_panel()
+
+    expected_df = process_data(main_df.copy())
+    actual_df = pd.concat(
+        iter_processed_chunks(main_df.copy(), chunk_locations=37), ignore_index=True
+    )
+
+    key = ["Date", "Country/Region", "Province/State"]
+    expected_df = expected_df.sort_values(key).reset_index(drop=True)
+    actual_df = actual_df.sort_values(key).reset_index(drop=True)
+    assert actual_df.equals(expected_df)
@@ -0,0 +1,161 @@
+import catboost as cb
+import numpy as np
+import pandas as pd
+import pytest
+
+from assignment.config import cat_features, location_columns
+from assignment.predict import _predict_for_dataset, _to_panel_positions
+
+DAYS_HISTORY_SIZE = 3
+prediction_types = ["LogNewConfirmedCases", "LogNewFatalities"]
+
+
+# Per-day loop that _predict_for_dataset replaced, kept as the reference
+def _reference_predict_for_dataset(
+    df, features_df, prev_day_df, first_date, last_date, update_features_data, models
+):
+    df["PredictedLogNewConfirmedCases"] = np.nan
+    df["PredictedLogNewFatalities"] = np.nan
+    df["PredictedConfirmedCases"] = np.nan
+    df["PredictedFatalities"] = np.nan
+
+    for day in pd.date_range(first_date, last_date):
+        day_df = df[df["Date"] == day]
+        day_features_pool = cb.Pool(
+            features_df.loc[day_df.index], cat_features=cat_features
+        )
+
+        for prediction_type in prediction_types:
+            df.loc[day_df.index, "Predicted" + prediction_type] = np.maximum(
+                models[prediction_type].predict(day_features_pool), 0.0
+            )
+
+        day_predictions_df = df.loc[day_df.index][
+            location_columns
+            + ["PredictedLogNewConfirmedCases", "PredictedLogNewFatalities"]
+        ]
+
+        for field in ["ConfirmedCases", "Fatalities"]:
+            prev_day_field = field if day == first_date else ("Predicted" + field)
+            merged_df = day_predictions_df.merge(
+                right=prev_day_df[location_columns + [prev_day_field]],
+                how="inner",
+                on=location_columns,
+            )
+
+            df.loc[day_df.index, "Predicted" + field] = merged_df.apply(
+                lambda row: row[prev_day_field]
+                + np.rint(np.expm1(row["PredictedLogNew" + field])),
+                axis="columns",
+            ).values
+
+        if update_features_data:
+            for next_day in pd.date_range(day + pd.Timedelta(days=1), last_date):
+                next_day_features_df = features_df[df["Date"] == next_day]
+                merged_df = next_day_features_df[location_columns].merge(
+                    right=day_predictions_df, how="inner", on=location_columns
+                )
+
+                prev_day_idx = (next_day - day).days
+                for prediction_type in prediction_types:
+                    features_df.loc[
+                        next_day_features_df.index,
+                        prediction_type + "_prev_day_%s" % prev_day_idx,
+                    ] = merged_df["Predicted" + prediction_type].values
+
+        prev_day_df = df.loc[day_df.index]
+
+
+def _make_panel(n_days: int = 8, seed: int = 0) -> pd.DataFrame:
+    # Every location has a row for each day, in shuffled order
+    rng = np.random.default_rng(seed)
+    locations = [("Italy", ""), ("China", "Hubei"), ("China", "Beijing"), ("US", "")]
+    dates = pd.date_range("2020-03-01", periods=n_days)
+    df = pd.DataFrame(
+        [
+            (country, province, date)
+            for country, province in locations
+            for date in dates
+        ],
+        columns=location_columns + ["Date"],
+    )
+    df["Day"] = (df["Date"] - dates[0]).dt.days
+    for field in ["ConfirmedCases", "Fatalities"]:
+        df[field] = rng.integers(0, 1000, len(df)).astype(float)
+    for prediction_type in prediction_types:
+        for k in range(1, DAYS_HISTORY_SIZE + 1):
+            df[f"{prediction_type}_prev_day_{k}"] = rng.uniform(0, 5, len(df))
+    return df.sample(frac=1, random_state=seed)
+
+
+def _features(df: pd.DataFrame) -> pd.DataFrame:
+    return df.drop(columns=["Date", "ConfirmedCases", "Fatalities"])
+
+
+def _train_models(seed: int = 0) -> dict:
+    train_df = _make_panel(n_days=20, seed=seed + 1)
+    # Categorical columns first, so that a panel matching features by position
+    # instead of by name would fail
+    features_df = _features(train_df)
+    features_df = features_df[
+        cat_features + [c for c in features_df.columns if c not in cat_features]
+    ]
+    rng = np.random.default_rng(seed)
+    models = {}
+    for prediction_type in prediction_types:
+        model = cb.CatBoostRegressor(
+            iterations=20, random_seed=seed, allow_writing_files=False, verbose=False
+        )
+        model.fit(
+            features_df,
+            features_df[f"{prediction_type}_prev_day_1"]
+            + rng.normal(0, 0.1, len(features_df)),
+            cat_features=cat_features,
+        )
+        models[prediction_type] = model
+    return models
+
+
+@pytest.mark.parametrize("update_features_data", [False, True])
+def test_predict_for_dataset_matches_reference_loop(update_features_data):
+    panel_df = _make_panel()
+    models = _train_models()
+    first_date = panel_df["Date"].min() + pd.Timedelta(days=1)
+    last_date = panel_df["Date"].max()
+
+    prev_day_df = panel_df.loc[panel_df["Date"] < first_date]
+    df = panel_df.loc[panel_df["Date"] >= first_date]
+
+    expected_df = df.copy()
+    _reference_predict_for_dataset(
+        expected_df,
+        _features(expected_df),
+        prev_day_df,
+        first_date,
+        last_date,
+        update_features_data,
+        models,
+    )
+    actual_df = df.copy()
+    _predict_for_dataset(
+        actual_df,
+        _features(actual_df),
+        prev_day_df,
+        first_date,
+        last_date,
+        update_features_data,
+        models,
+    )
+
+    pd.testing.assert_frame_equal(actual_df, expected_df, check_exact=True)
+
+
+def test_to_panel_positions_requires_every_day():
+    df = _make_panel()
+    first_date, last_date = df["Date"].min(), df["Date"].max()
+    missing_day = (df["Country/Region"] == "Italy") & (
+        df["Date"] == first_date + pd.Timedelta(days=3)
+    )
+
+    with pytest.raises(ValueError, match="Every location needs a row"):
+        _to_panel_positions(df.loc[~missing_day], first_date, last_date)
@@ -0,0 +1,94 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from assignment import config
+from assignment import features
+from assignment import instrumentation
+from assignment.features import process_data
+from assignment.serve import ForecastService, make_server
+from assignment.train import _save_models, _train
+from tests.test_features import _country_features, _week_1_panel
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(features, "build_country_features", _country_features)
+        mp.setattr(config, "MODELS_DIR", str(tmp_path_factory.mktemp("models")))
+        processed_df = process_data(_week_1_panel())
+        models = _train(
+            processed_df,
+            iterations=10,
+            workers=1,
+            catboost_params={"allow_writing_files": False},
+        )
+        _save_models(models)
+
+        # Port 0 picks a free port
+        server = make_server(ForecastService(processed_df), port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}"
+        server.shutdown()
+        server.server_close()
+
+
+def _request(url: str, method: str = "GET"):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method=method)) as r:
+            return r.status, json.load(r)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_health(server):
+    assert _request(f"{server}/health") == (200, {"status": "ok"})
+
+
+def test_forecast(server):
+    status, body = _request(
+        f"{server}/forecast?country=US&province=Kansas&start=2020-03-25&end=2020-03-27"
+    )
+
+    assert status == 200
+    assert [day["Date"] for day in body["forecast"]] == [
+        "2020-03-25",
+        "2020-03-26",
+        "2020-03-27",
+    ]
+    assert all(day["PredictedConfirmedCases"] is not None for day in body["forecast"])
+
+
+def test_forecast_of_unknown_location(server):
+    status, body = _request(f"{server}/forecast?country=Atlantis&start=2020-03-25")
+    assert status == 404
+
+
+def test_reload_records_only_its_own_stages(server):
+    stage_counts = []
+    for _ in range(2):
+        assert _request(f"{server}/reload", method="POST") == (
+            200,
+            {"status": "reloaded"},
+        )
+        stage_counts.append(len(instrumentation._run["stages"]))
+    assert stage_counts[0] == stage_counts[1]
+
+
+def test_failed_reload_keeps_serving(server, tmp_path, monkeypatch):
+    # No models to load
+    monkeypatch.setattr(config, "MODELS_DIR", str(tmp_path))
+
+    status, body = _request(f"{server}/reload", method="POST")
+    assert status == 500
+    assert "No trained models found" in body["error"]
+
+    status, body = _request(
+        f"{server}/forecast?country=US&province=Kansas&start=2020-03-25"
+    )
+    assert status == 200
+    assert len(body["forecast"]) == 1